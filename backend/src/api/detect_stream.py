@@ -0,0 +1,136 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
+
+from src.api.user import get_current_user
+from src.database.session import SessionLocal
+from src.inference.service import (
+    InvalidImageError, ModelNotReadyError, OverloadedError, detect_bytes, reset_session
+)
+
+router = APIRouter()
+
+
+class LatestFrameSlot:
+    """
+    Слот на один кадр: хранит только самый свежий ещё не обработанный кадр соединения.
+    Если клиент прислал новый кадр, пока предыдущий ждал инференса, старый выбрасывается.
+    Приоритет выброшенного кадра переходит к заменившему его.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.priority = False
+        self.seq = 0
+        self.dropped = 0
+        self._event = asyncio.Event()
+
+    def put(self, data: bytes, priority: bool = False):
+        if self.frame is not None:
+            self.dropped += 1
+        else:
+            self.priority = False
+        self.priority = self.priority or priority
+        self.seq += 1
+        self.frame = (self.seq, data)
+        self._event.set()
+
+    async def take(self):
+        await self._event.wait()
+        self._event.clear()
+        frame, self.frame = self.frame, None
+        return frame + (self.priority,)
+
+
+def authenticate_token(token: str) -> int:
+    db = SessionLocal()
+    try:
+        return get_current_user(token, db).id
+    finally:
+        db.close()
+
+
+async def detect_reply(data: bytes, session_key=None, priority: bool = False) -> dict:
+    """Ответ на кадр для веб-сокета: результат detect_bytes или {"error", ...} вместо исключения."""
+    try:
+        return await detect_bytes(data, session_key=session_key, priority=priority)
+    except InvalidImageError as e:
+        return {"error": str(e)}
+    except OverloadedError as e:
+        return {"error": str(e), "retry_after": e.retry_after, "scan_interval_ms": e.scan_interval_ms}
+    except ModelNotReadyError as e:
+        return {"error": str(e), "retry_after": 5}
+    except Exception as e:
+        # Сбой движка или сайдкара на одном кадре не должен обрывать поток кадров
+        print(f"Frame detection failed: {e!r}")
+        return {"error": "Ошибка распознавания", "retry_after": 1}
+
+
+async def serve_frames(websocket: WebSocket, slot: LatestFrameSlot, user_id: int):
+    while True:
+        seq, data, priority = await slot.take()
+        reply = await detect_reply(data, user_id, priority)
+        reply.update({"frame": seq, "dropped": slot.dropped})
+        await websocket.send_json(reply)
+
+
+@router.websocket("/ws/detect")
+async def detect_stream(websocket: WebSocket):
+    """
+    Потоковая детекция: первое сообщение – {"action": "auth", "token": "..."},
+    далее клиент шлёт JPEG-кадры бинарными сообщениями и получает
+    {"frame", "gesture", "bbox", "smoothed_gesture", "smoothed_confidence", "stable", "scan_interval_ms", "dropped"}
+    по тому же соединению. Текстовое {"action": "reset"} начинает новый раунд,
+    {"action": "priority"} помечает следующий кадр как решающий (идёт вне очереди).
+    """
+    await websocket.accept()
+    try:
+        auth_data = await websocket.receive_json()
+        # Первое сообщение – JSON-объект; массив, строка и т. п. – такая же ошибка авторизации
+        is_auth = isinstance(auth_data, dict) and auth_data.get("action") == "auth"
+        token = auth_data.get("token") if is_auth else None
+        if not token:
+            await websocket.close(code=1008)
+            return
+        user_id = await run_in_threadpool(authenticate_token, token)
+    except (HTTPException, ValueError, KeyError):
+        await websocket.close(code=1008)
+        return
+    except WebSocketDisconnect:
+        return
+    await websocket.send_json({"action": "auth_ok", "user_id": user_id})
+
+    slot = LatestFrameSlot()
+    next_priority = False
+    worker = asyncio.create_task(serve_frames(websocket, slot, user_id))
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                slot.put(message["bytes"], next_priority)
+                next_priority = False
+            elif message.get("text"):
+                try:
+                    action = json.loads(message["text"]).get("action")
+                except (ValueError, AttributeError):
+                    action = None
+                if action == "reset":
+                    await reset_session(user_id)
+                elif action == "priority":
+                    next_priority = True
+            if worker.done():
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if worker.done() and not worker.cancelled() and worker.exception() is not None:
+            # Ответ клиенту не ушёл – соединение закрывается с ошибкой, а не висит без ответов
+            print(f"Detection stream for user {user_id} failed: {worker.exception()!r}")
+            try:
+                await websocket.close(code=1011)
+            except RuntimeError:
+                pass  # уже закрыто
+        worker.cancel()
@@ -0,0 +1,80 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from collections import deque
+from typing import Dict
+import asyncio
+
+from src.inference import service as inference_service
+
+router = APIRouter()
+
+# Время импорта модулей приложения при старте (заполняет src.main), мс
+import_report: Dict[str, object] = {"modules_ms": {}, "total_ms": 0.0, "budget_ms": None, "over_budget": False}
+
+
+class LoopLagMonitor:
+    """
+    Задержка event loop: раз в interval_ms задача засыпает и меряет, насколько позже срока
+    проснулась. Рост задержки – признак блокирующего кода или перегрузки процесса
+    (например, слишком многих игроков на одном воркере). Хранятся последние samples замеров.
+    """
+
+    def __init__(self, interval_ms: float = 50, samples: int = 1200):
+        self.interval = interval_ms / 1000
+        self._lags = deque(maxlen=samples)
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self._lags.append(max(0.0, loop.time() - started - self.interval))
+
+    def report(self) -> dict:
+        lags = sorted(self._lags)
+        if not lags:
+            return {"samples": 0}
+
+        def percentile(q):
+            return round(lags[min(len(lags) - 1, int(q / 100 * len(lags)))] * 1000, 2)
+
+        return {
+            "samples": len(lags),
+            "window_s": round(len(lags) * self.interval),
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+            "max_ms": round(lags[-1] * 1000, 2),
+        }
+
+
+# Запускается при старте приложения (src.main)
+loop_lag = LoopLagMonitor()
+
+
+@router.get("/healthz", summary="Liveness: процесс жив и отвечает")
+def healthz():
+    report = {"status": "ok", "imports": import_report, "loop_lag": loop_lag.report()}
+    if inference_service.readiness["fatal"]:
+        # Модель не загрузилась и после повторов – процесс нужно перезапустить
+        report.update(status="failed", detail=inference_service.readiness["error"])
+        return JSONResponse(status_code=503, content=report)
+    return report
+
+
+@router.get("/readyz", summary="Readiness: модель загружена и прогрета")
+async def readyz():
+    readiness = await inference_service.status()
+    if readiness["ready"]:
+        return {"status": "ready", "load_seconds": readiness["load_seconds"]}
+    status = "error" if readiness["error"] else "loading"
+    return JSONResponse(
+        status_code=503,
+        content={"status": status, "detail": readiness["error"]},
+        headers={"Retry-After": "5"},
+    )
@@ -1,40 +1,160 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
-import cv2
-import numpy as np
-from ultralytics import YOLO
-import os
+from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+import json
+import tarfile
+import zipfile
 
-router = APIRouter()
+from src.api.user import get_current_user, get_optional_user_id
+from src.config import settings
+from src.database.models import User
+from src.inference.service import (
+    InvalidImageError, ModelNotReadyError, OverloadedError, detect_bytes, detect_many, ensure_ready, reset_session
+)
 
-current_dir = os.path.dirname(__file__)
-model_path = os.path.join(current_dir, "best.pt")
-model = YOLO(model_path)
+router = APIRouter()
 
-# Соответствие классов жестам
-class_names = {0: "Paper", 1: "Rock", 2: "Scissors"}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
 
 @router.post("/detect", tags=["Model"])
-async def detect(file: UploadFile = File(...)):
+async def detect(
+    file: UploadFile = File(...),
+    reset: bool = Form(False),
+    priority: bool = Form(False),
+    user_id: Optional[int] = Depends(get_optional_user_id)
+):
+    """
+    Детекция жеста на кадре. Для авторизованных пользователей ведётся сессия:
+    слежение за рукой и сглаженный жест (smoothed_gesture, smoothed_confidence, stable).
+    reset=true – первый кадр нового раунда, история жестов сессии сбрасывается.
+    priority=true – кадр, решающий исход (финальный жест боя, результат раунда): идёт вне очереди.
+    При перегрузке – 429 с Retry-After; в ответе scan_interval_ms – через сколько слать следующий кадр.
+    """
     try:
         image_bytes = await file.read()
-        np_arr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        if frame is None:
-            raise HTTPException(status_code=400, detail="Неверное изображение")
-
-        results = model(frame)
-        gesture = "No detection"  # значение по умолчанию
-        bbox = []  # если нужны координаты – здесь они, но в клиентском коде используется только gesture
-
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None and len(boxes) > 0:
-                box = boxes[0]
-                cls = int(box.cls[0])
-                gesture = class_names.get(cls, "Unknown")
-                bbox = list(map(int, box.xyxy[0].tolist()))
-                break
-
-        return {"gesture": gesture, "bbox": bbox}
+        if reset and user_id is not None:
+            await reset_session(user_id)
+        return await detect_bytes(image_bytes, session_key=user_id, priority=priority)
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OverloadedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+class ArchiveTooLargeError(ValueError):
+    """Архив превышает лимиты INFERENCE_BULK_MAX_* (ответ 413)."""
+
+
+def check_archive_limits(members):
+    """
+    members – (имя, распакованный размер) файлов архива по заголовкам. Проверяет лимиты
+    до чтения содержимого, чтобы небольшой архив-бомба не распаковался в память целиком;
+    перебор останавливается на первом превышении.
+    """
+    max_file = settings.INFERENCE_BULK_MAX_FILE_MB * 1024 * 1024
+    max_total = settings.INFERENCE_BULK_MAX_TOTAL_MB * 1024 * 1024
+    count = total = 0
+    for name, size in members:
+        count += 1
+        if count > settings.INFERENCE_BULK_MAX_FILES:
+            raise ArchiveTooLargeError(f"В архиве больше {settings.INFERENCE_BULK_MAX_FILES} файлов")
+        if size > max_file:
+            raise ArchiveTooLargeError(f"Файл {name} больше {settings.INFERENCE_BULK_MAX_FILE_MB:g} МБ")
+        total += size
+        if total > max_total:
+            raise ArchiveTooLargeError(f"Архив больше {settings.INFERENCE_BULK_MAX_TOTAL_MB:g} МБ в распакованном виде")
+
+
+def open_archive(fileobj):
+    """
+    Итератор (имя, байты) по изображениям zip- или tar-архива; ValueError, если это не архив,
+    ArchiveTooLargeError, если он превышает лимиты (см. check_archive_limits).
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        archive = zipfile.ZipFile(fileobj)
+        infos = [info for info in archive.infolist() if not info.is_dir()]
+        try:
+            check_archive_limits((info.filename, info.file_size) for info in infos)
+        except ArchiveTooLargeError:
+            archive.close()
+            raise
+
+        def iter_zip():
+            with archive:
+                for info in infos:
+                    if info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        # ZipExtFile отдаёт не больше file_size байт, уже проверенного выше
+                        yield info.filename, archive.read(info)
+        return iter_zip()
+
+    def open_tar():
+        fileobj.seek(0)
+        try:
+            return tarfile.open(fileobj=fileobj, mode="r:*")
+        except tarfile.TarError:
+            raise ValueError("Архив должен быть в формате zip или tar")
+
+    # Первый проход – только заголовки; второй открывает архив заново и читает его
+    # последовательно (обратные перемотки по tar.gz распаковывали бы его с начала)
+    with open_tar() as archive:
+        check_archive_limits((member.name, member.size) for member in archive if member.isfile())
+    archive = open_tar()
+
+    def iter_tar():
+        with archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield member.name, archive.extractfile(member).read()
+    return iter_tar()
+
+
+async def iter_uploads(files: List[UploadFile], archive_items):
+    for file in files:
+        yield file.filename, await file.read()
+    if archive_items is not None:
+        # Чтение архива – блокирующий ввод-вывод, поэтому по одному элементу в пуле потоков
+        while True:
+            item = await run_in_threadpool(next, archive_items, None)
+            if item is None:
+                break
+            yield item
+
+
+@router.post("/detect/bulk", tags=["Model"])
+async def detect_bulk(
+    files: List[UploadFile] = File(default=[]),
+    archive: Optional[UploadFile] = File(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Пакетная детекция для офлайн-оценки и модерации: изображения приходят списком files
+    и/или одним zip/tar-архивом archive. Ответ – NDJSON, по строке на изображение в исходном
+    порядке: {"index", "name", "gesture", "bbox"} или {"index", "name", "error"}.
+    """
+    try:
+        await ensure_ready()
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    archive_items = None
+    if archive is not None:
+        try:
+            archive_items = await run_in_threadpool(open_archive, archive.file)
+        except ArchiveTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not files and archive_items is None:
+        raise HTTPException(status_code=400, detail="Нет изображений")
+
+    async def ndjson():
+        images = iter_uploads(files, archive_items)
+        async for result in detect_many(images, settings.INFERENCE_BULK_CONCURRENCY):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
@@ -1,234 +1,186 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
-from typing import Dict, List
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
 import asyncio
+import json
+
+from src.api.detect_stream import LatestFrameSlot, detect_reply
+from src.config import settings
+from src.inference.model import NO_DETECTION
+from src.inference.service import reset_session, smoothed_gesture
+from src.multiplayer import protocol
+from src.multiplayer.backends import create_backend
 
 router = APIRouter()
 
-# In-memory структуры для очереди и матчей
-waiting_players: List[Dict] = []  # Каждый элемент: { "user_id": str, "websocket": WebSocket, "ready": bool }
-active_matches: Dict[str, dict] = {}  # Ключ: match_id, значение: { players, battle_started, gestures, play_again, concluded }
+# Очередь, матчи и ход боя – в хабе (src/multiplayer/hub.py). Эндпоинт только принимает
+# веб-сокет и пересылает сообщения игрока бэкенду: хабу в этом процессе или брокеру,
+# общему для всех воркеров (MULTIPLAYER_BACKEND)
+backend = create_backend()
+
+# Бинарное сообщение игрока – кадр камеры: байт флагов + JPEG
+FRAME_FINAL = 1  # финальный кадр боя (ответ на capture), распознаётся вне очереди
+FRAME_RESET = 2  # первый кадр нового раунда – история сглаживания жеста сбрасывается
+
+async def resolve_smoothed(user_id):
+    """
+    Жест игрока, сглаженный по кадрам раунда в сессии детекции. Сессии живут в сервисе
+    инференса этого воркера (или в общем сайдкаре), поэтому жест подставляется здесь, до хаба.
+    """
+    if not str(user_id).isdigit():
+        return None
+    try:
+        return await smoothed_gesture(int(user_id))
+    except RuntimeError:
+        # Сервер инференса (сайдкар) недоступен – обходимся жестом клиента
+        return None
+
+class PlayerFrames:
+    """
+    Кадры игрока, присланные по сокету матча: жест распознаёт сервер, а не клиент.
+    Фоновые кадры обрабатываются по одному, свежий вытесняет ждущий (LatestFrameSlot);
+    в ответ клиент получает {"action": "detection", ...} с рамкой и интервалом сканирования.
+    Стабильный сглаженный жест фиксируется до конца раунда. Финальный кадр распознаётся
+    вне очереди (если жест ещё не зафиксирован), и итоговый жест уходит хабу.
+    """
+
+    def __init__(self, conn: str, user_id):
+        self.conn = conn
+        self.user_id = user_id
+        self.session_key = int(user_id) if str(user_id).isdigit() else None
+        self.slot = LatestFrameSlot()
+        self.locked = None
+        self.task = None
 
-def determine_result(gesture1: str, gesture2: str) -> str:
-    gesture1 = gesture1.strip().lower()
-    gesture2 = gesture2.strip().lower()
-    if gesture1 != "none" and gesture2 == "none":
-        return "win"
-    if gesture1 == "none" and gesture2 != "none":
-        return "loss"
-    if gesture1 == gesture2:
-        return "draw"
-    if (gesture1 == "rock" and gesture2 == "scissors") or \
-       (gesture1 == "scissors" and gesture2 == "paper") or \
-       (gesture1 == "paper" and gesture2 == "rock"):
-        return "win"
-    return "loss"
+    async def put(self, payload: bytes):
+        if not payload:
+            return
+        flags, image = payload[0], payload[1:]
+        if flags & FRAME_RESET:
+            self.locked = None
+            if self.session_key is not None:
+                try:
+                    await reset_session(self.session_key)
+                except RuntimeError:
+                    pass
+        self.slot.put(image, bool(flags & FRAME_FINAL))
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self):
+        while True:
+            seq, image, final = await self.slot.take()
+            # Сбой на одном кадре (движок, сайдкар, брокер) не должен останавливать задачу:
+            # иначе финальные жесты игрока до конца соединения не дойдут до хаба
+            try:
+                if final:
+                    await self.finish(image)
+                    continue
+                reply = await detect_reply(image, self.session_key)
+                if reply.get("stable"):
+                    self.locked = reply["smoothed_gesture"]
+                reply.update({"action": "detection", "frame": seq})
+                await backend.send([self.conn], reply)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Multiplayer frame from {self.conn} failed: {e!r}")
+
+    async def finish(self, image: bytes):
+        gesture = self.locked
+        if gesture is None:
+            # Финальные кадры обоих игроков приходят по одному сигналу capture и попадают в один батч
+            reply = await detect_reply(image, self.session_key, priority=True)
+            if reply.get("gesture") not in (None, NO_DETECTION):
+                gesture = reply["gesture"]
+        message = {"action": "gesture", "gesture": gesture or "none"}
+        if gesture is None:
+            try:
+                message["smoothed"] = await resolve_smoothed(self.user_id)
+            except Exception as e:
+                print(f"Smoothed gesture for {self.user_id} failed: {e!r}")
+                message["smoothed"] = None
+        await backend.handle(self.conn, message)
 
 @router.websocket("/ws/multiplayer")
 async def multiplayer_endpoint(websocket: WebSocket):
-    await websocket.accept()
+    """
+    Текстовые сообщения – JSON-действия игры (join, ready, signal, ...), бинарные – кадры камеры
+    (байт флагов FRAME_* + JPEG). Если клиент согласовал подпротокол protocol.SUBPROTOCOL,
+    сообщения бинарные с байтом типа (src/multiplayer/protocol.py), а signal пересылается без разбора.
+    Если клиент шлёт кадры, жест определяет сервер, а жесты, присланные клиентом в JSON,
+    игнорируются; старые клиенты по-прежнему присылают жест сами.
+    На {"action": "ping"} сервера клиент отвечает {"action": "pong"}; соединение, от которого
+    ничего не приходит дольше MULTIPLAYER_IDLE_TIMEOUT_S (несколько пропущенных ping), закрывается
+    как оборванное – в том числе у клиентов, которые pong не шлют вовсе.
+    """
+    binary = protocol.SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol=protocol.SUBPROTOCOL if binary else None)
+    conn = backend.connect(websocket, binary)
     user_id = None
-    current_match_id = None
+    frames = None
     try:
-        join_data = await websocket.receive_json()
-        if join_data.get("action") != "join" or "user_id" not in join_data:
-            await websocket.close(code=1008)
-            return
-        user_id = join_data["user_id"]
-        waiting_players.append({"user_id": user_id, "websocket": websocket, "ready": False})
-        await websocket.send_json({"action": "status", "message": "Вы в очереди на игру."})
-        if len(waiting_players) >= 2:
-            player1 = waiting_players.pop(0)
-            player2 = waiting_players.pop(0)
-            match_id = f"{player1['user_id']}_{player2['user_id']}"
-            current_match_id = match_id
-            active_matches[match_id] = {
-                "players": [player1, player2],
-                "battle_started": False,
-                "gestures": {},
-                "play_again": {},
-                "concluded": False
-            }
-            match_msg = {"action": "match_found", "match_id": match_id, "players": [player1["user_id"], player2["user_id"]]}
-            for p in [player1, player2]:
-                await p["websocket"].send_json(match_msg)
-        while True:
-            data = await websocket.receive_json()
-            action = data.get("action")
-            if action == "signal":
-                match = find_match_by_websocket(websocket)
-                if match:
-                    for p in match["players"]:
-                        if p["websocket"] != websocket:
-                            await p["websocket"].send_json({"action": "signal", "data": data.get("data")})
+        # Хаб может закрыть соединение сам (например, повторный вход того же игрока)
+        while websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), settings.MULTIPLAYER_IDLE_TIMEOUT_S)
+            except asyncio.TimeoutError:
+                await backend.close(conn, 1001)
+                break
+            if message["type"] == "websocket.disconnect":
+                break
+            payload = message.get("bytes")
+            if payload is None:
+                kind, payload = protocol.MSG_JSON, message.get("text")
+            elif binary:
+                kind, payload = protocol.unpack(payload)
+            else:
+                kind = protocol.MSG_FRAME
+            if kind == protocol.MSG_FRAME:
+                if user_id is not None:
+                    frames = frames or PlayerFrames(conn, user_id)
+                    await frames.put(payload)
+                continue
+            if kind == protocol.MSG_SIGNAL:
+                # Не разбирается: бинарный соперник получит байты как есть (см. protocol.to_text)
+                await backend.handle(conn, {"action": "signal", "raw": payload})
+                continue
+            if kind != protocol.MSG_JSON:
                 continue
-            match, current_match_id = find_match_by_websocket_and_id(websocket)
-            if not match:
+            try:
+                data = json.loads(payload or "")
+                action = data.get("action")
+            except (ValueError, AttributeError):
                 continue
-            if action == "ready":
-                for p in match["players"]:
-                    if p["websocket"] == websocket:
-                        p["ready"] = True
-                if all(p["ready"] for p in match["players"]):
-                    match["battle_started"] = True
-                    match["concluded"] = False
-                    start_msg = {"action": "battle_start", "duration": 10}
-                    for p in match["players"]:
-                        await p["websocket"].send_json(start_msg)
-                    # Запуск асинхронного ожидания финальных gesture-сообщений
-                    asyncio.create_task(send_blackout_and_end(match, current_match_id))
-            elif action == "unready":
-                for p in match["players"]:
-                    if p["websocket"] == websocket:
-                        p["ready"] = False
-                unready_msg = {"action": "player_unready", "user_id": user_id}
-                for p in match["players"]:
-                    await p["websocket"].send_json(unready_msg)
+            if action == "pong":
+                continue
+            if action == "join" and user_id is None:
+                user_id = data.get("user_id")
             elif action == "gesture":
-                gesture_value = data.get("gesture")
-                last_valid = data.get("lastValidGesture")
-                if gesture_value is not None:
-                    if gesture_value != "none":
-                        match["gestures"][user_id] = gesture_value
-                    else:
-                        if last_valid and last_valid != "none":
-                            match["gestures"][user_id] = last_valid
-                        elif user_id not in match["gestures"]:
-                            match["gestures"][user_id] = "none"
-            elif action == "play_again":
-                match["play_again"][user_id] = True
-                for p in match["players"]:
-                    if p["user_id"] != user_id:
-                        await p["websocket"].send_json({
-                            "action": "opponent_play_again",
-                            "message": f"Игрок {user_id} хочет сыграть ещё."
-                        })
-                if len(match["play_again"]) == 2:
-                    for p in match["players"]:
-                        p["ready"] = False
-                    match["gestures"] = {}
-                    match["play_again"] = {}
-                    match["battle_started"] = False
-                    match["concluded"] = False
-                    replay_msg = {"action": "replay", "message": "Начните новую битву, нажмите 'Готов'."}
-                    for p in match["players"]:
-                        await p["websocket"].send_json(replay_msg)
+                if frames is not None:
+                    continue
+                if data.get("gesture") == "none":
+                    data["smoothed"] = await resolve_smoothed(user_id)
+            await backend.handle(conn, data)
     except WebSocketDisconnect:
-        waiting_players[:] = [p for p in waiting_players if p["websocket"] != websocket]
-        match, current_match_id = find_match_by_websocket_and_id(websocket)
-        if match:
-            disconnect_msg = {"action": "disconnect", "message": f"Игрок {user_id} отключился."}
-            for p in match["players"]:
-                if p["websocket"] != websocket:
-                    try:
-                        await p["websocket"].send_json(disconnect_msg)
-                    except Exception:
-                        pass
-            if current_match_id in active_matches:
-                del active_matches[current_match_id]
-
-def find_match_by_websocket(ws: WebSocket):
-    for m in active_matches.values():
-        for p in m["players"]:
-            if p["websocket"] == ws:
-                return m
-    return None
-
-def find_match_by_websocket_and_id(ws: WebSocket):
-    for mid, m in active_matches.items():
-        for p in m["players"]:
-            if p["websocket"] == ws:
-                return m, mid
-    return None, None
-
-def save_match_result(match, g1, g2, winner):
-    from src.database.session import SessionLocal
-    from src.database.models import MultiplayerGame, User
-    db = SessionLocal()
-    try:
-        player1_id = int(match["players"][0]["user_id"])
-        player2_id = int(match["players"][1]["user_id"])
-        resultValue = "draw" if winner == "draw" else ("player1" if winner == match["players"][0]["user_id"] else "player2")
-        new_game = MultiplayerGame(
-            player1_id=player1_id,
-            player2_id=player2_id,
-            player1_gesture=g1.lower(),
-            player2_gesture=g2.lower(),
-            result=resultValue
-        )
-        db.add(new_game)
-        player1 = db.query(User).filter(User.id == player1_id).first()
-        player2 = db.query(User).filter(User.id == player2_id).first()
-        if player1:
-            player1.online_games = (player1.online_games or 0) + 1
-        if player2:
-            player2.online_games = (player2.online_games or 0) + 1
-        if resultValue == "player1" and player1:
-            player1.online_wins = (player1.online_wins or 0) + 1
-        elif resultValue == "player2" and player2:
-            player2.online_wins = (player2.online_wins or 0) + 1
-
-        db.commit()
-        db.refresh(new_game)
-        return new_game.id, resultValue
-    except Exception as e:
-        db.rollback()
-        raise e
+        pass
+    except ConnectionError:
+        # Брокер онлайн-режима недоступен
+        await websocket.close(code=1011)
     finally:
-        db.close()
+        if frames is not None:
+            frames.close()
+        await backend.disconnect(conn)
 
-async def conclude_battle(match, match_id):
-    if match.get("concluded"):
-        return
-    match["concluded"] = True
-    for p in match["players"]:
-        if p["user_id"] not in match["gestures"]:
-            match["gestures"][p["user_id"]] = "none"
-    g1 = match["gestures"][match["players"][0]["user_id"]]
-    g2 = match["gestures"][match["players"][1]["user_id"]]
-    res = determine_result(g1, g2)
-    if res == "win":
-        winner_id = match["players"][0]["user_id"]
-    elif res == "loss":
-        winner_id = match["players"][1]["user_id"]
-    else:
-        winner_id = "draw"
-    game_id, savedResult = save_match_result(match, g1, g2, winner_id)
-    
-    # Получение username победителя, если результат не "draw"
-    if winner_id != "draw":
-        from src.database.session import SessionLocal
-        from src.database.models import User
-        db = SessionLocal()
-        try:
-            winner_user = db.query(User).filter(User.id == int(winner_id)).first()
-            winner_username = winner_user.username if winner_user else winner_id
-        finally:
-            db.close()
-    else:
-        winner_username = "draw"
-    
-    end_msg = {
-        "action": "battle_end",
-        "winner": winner_username,
-        "gestures": match["gestures"],
-        "game_id": game_id
-    }
-    for p in match["players"]:
-        await p["websocket"].send_json(end_msg)
-    match["battle_started"] = False
-
-async def send_blackout_and_end(match, match_id):
-    await asyncio.sleep(7)
-    blackout_msg = {"action": "blackout", "duration": 3}
-    for p in match["players"]:
-        await p["websocket"].send_json(blackout_msg)
-    # Вместо фиксированного ожидания, ждем пока оба игрока отправят gesture (или истечет таймаут)
-    timeout = 5  # максимум ждем 5 секунд
-    start_time = asyncio.get_event_loop().time()
-    while True:
-        if all(p["user_id"] in match["gestures"] for p in match["players"]):
-            break
-        if asyncio.get_event_loop().time() - start_time > timeout:
-            break
-        await asyncio.sleep(0.1)
-    await conclude_battle(match, match_id)
+@router.get("/multiplayer/matchmaking/stats", tags=["Multiplayer"], summary="Глубина очереди и время до матча")
+async def matchmaking_stats():
+    try:
+        stats = await backend.stats()
+    except ConnectionError as e:
+        # Брокер онлайн-режима недоступен
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    # Очереди исходящих сообщений – только этого воркера
+    return dict(stats, outbound=backend.outbound_stats())
@@ -16,6 +16,7 @@ from src.config import settings
 router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 # ---------------------------
 # Вспомогательные схемы (Pydantic)
@@ -70,6 +71,19 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         )
     return user
 
+def get_optional_user_id(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[int]:
+    """
+    Возвращает user_id из JWT-токена без обращения к базе.
+    Если токена нет или он невалиден – None (для эндпоинтов, где авторизация не обязательна).
+    """
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        return int(payload.get("sub"))
+    except (jwt.PyJWTError, TypeError, ValueError):
+        return None
+
 # ---------------------------
 # Эндпоинты
 # ---------------------------
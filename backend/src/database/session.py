@@ -1,19 +1,51 @@
-import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 
-# Определяем абсолютный путь к директории, где находится данный файл (backend/src/database)
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+from src.config import settings
 
-# Формируем абсолютный путь к файлу базы данных (база будет храниться в папке database)
-DATABASE_PATH = os.path.join(BASE_DIR, "test.db")
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+# URL базы берётся из настроек (DATABASE_URL), по умолчанию – src/database/test.db
+SQLALCHEMY_DATABASE_URL = settings.SQLALCHEMY_DATABASE_URL
 
-# Создаем движок подключения к SQLite (параметр connect_args обязателен для SQLite)
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+
+def build_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """
+    Движок с пулом соединений по настройкам DATABASE_POOL_*. Для SQLite каждое новое
+    соединение переводится в режим WAL с synchronous=NORMAL, busy_timeout и mmap_size,
+    чтобы игры и результаты матчей, записываемые из разных потоков, не блокировали чтение.
+    """
+    url = make_url(url)
+    options = {"pool_pre_ping": settings.DATABASE_POOL_PRE_PING}
+    sqlite = url.get_backend_name() == "sqlite"
+    if not sqlite or url.database not in (None, "", ":memory:"):
+        # У базы в памяти SQLite свой пул на одно соединение – размеры к нему не применяются
+        options.update(
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT_S,
+            pool_recycle=settings.DATABASE_POOL_RECYCLE_S,
+        )
+    if sqlite:
+        # Сессии используются и из пула потоков (запись результатов, детекция)
+        options["connect_args"] = {"check_same_thread": False}
+    engine = create_engine(url, **options)
+    if sqlite:
+        event.listen(engine, "connect", _configure_sqlite)
+    return engine
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    finally:
+        cursor.close()
+
+
+engine = build_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,124 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, List
+
+
+class MicroBatcher:
+    """
+    Собирает кадры от параллельных запросов в один батч и прогоняет их через модель
+    одним вызовом. Батч уходит в модель, как только набралось max_batch_size кадров
+    или прошло max_wait_ms с момента прихода первого кадра батча.
+    Каждый вызывающий получает свой собственный результат.
+    Одновременно в работе не больше max_concurrency батчей (по числу воркеров
+    инференса), пока все воркеры заняты – новые кадры копятся в следующий батч.
+
+    Очередь ограничена: в каждой из двух полос (priority и обычной) ждут не больше
+    max_queue_size кадров, при переполнении submit бросает asyncio.QueueFull.
+    Кадры приоритетной полосы (финальный жест боя, результат раунда) попадают в батч
+    первыми, а батч с ними уходит в модель не дожидаясь max_wait_ms: через priority_wait_ms
+    (окно, чтобы финальные кадры обоих игроков и соседних боёв попали в один проход) или сразу.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch_size: int, max_wait_ms: float, max_concurrency: int = 1,
+                 max_queue_size: int = 64, priority_wait_ms: float = 0):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue_size = max(1, max_queue_size)
+        self.priority_wait = min(priority_wait_ms, max_wait_ms) / 1000
+        self._lanes = (deque(), deque())  # (приоритетная, обычная) полосы (кадр, future)
+        self._wakeup = None
+        self._slots = None
+        self._task = None
+        self._inflight = set()
+
+    def _ensure_started(self):
+        # Очередь и фоновая задача создаются лениво, уже внутри работающего event loop
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def queued(self) -> int:
+        """Кадров в очереди (обе полосы), ещё не отправленных в модель."""
+        return len(self._lanes[0]) + len(self._lanes[1])
+
+    @property
+    def load(self) -> float:
+        """Заполненность обычной полосы от 0 до 1."""
+        return min(1.0, len(self._lanes[1]) / self.max_queue_size)
+
+    def is_full(self, priority: bool = False) -> bool:
+        return len(self._lanes[0 if priority else 1]) >= self.max_queue_size
+
+    async def submit(self, frame, priority: bool = False):
+        self._ensure_started()
+        if self.is_full(priority):
+            raise asyncio.QueueFull()
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[0 if priority else 1].append((frame, future))
+        self._wakeup.set()
+        return await future
+
+    def _pop(self):
+        priority, normal = self._lanes
+        return (priority or normal).popleft()
+
+    async def _wait_items(self, timeout=None) -> bool:
+        while not self.queued:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        await self._wait_items()
+        urgent = bool(self._lanes[0])
+        batch = [self._pop()]
+        deadline = loop.time() + (self.priority_wait if urgent else self.max_wait)
+        while len(batch) < self.max_batch_size:
+            if self.queued:
+                if not urgent and self._lanes[0]:
+                    urgent = True
+                    deadline = min(deadline, loop.time() + self.priority_wait)
+                batch.append(self._pop())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0 or not await self._wait_items(timeout):
+                break
+        # Запросы, отменённые клиентом пока кадр ждал в очереди, в модель не отправляем
+        return [item for item in batch if not item[1].done()]
+
+    async def _dispatch(self, batch):
+        frames = [frame for frame, _ in batch]
+        try:
+            outputs = await self.run_batch(frames)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        for (_, future), output in zip(batch, outputs):
+            if not future.done():
+                future.set_result(output)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = await self._collect()
+            if not batch:
+                self._slots.release()
+                continue
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
@@ -0,0 +1,107 @@
+import asyncio
+import itertools
+from typing import Optional
+
+from src.inference import protocol
+from src.inference.errors import InvalidImageError, ModelNotReadyError, OverloadedError
+
+
+class SidecarClient:
+    """
+    Клиент сайдкара инференса в API-воркере. Одно Unix-соединение на процесс,
+    параллельные запросы мультиплексируются по id; соединение открывается лениво
+    и переоткрывается, если сайдкар перезапустился.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = None
+        self._reader_task = None
+        self._lock = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+
+    async def _connect(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError as e:
+                raise ModelNotReadyError(f"Сервер инференса недоступен: {e}")
+            self._writer = writer
+            self._reader_task = asyncio.get_running_loop().create_task(self._read_loop(reader, writer))
+            return writer
+
+    async def _read_loop(self, reader, writer):
+        try:
+            while True:
+                (status, request_id, _), payload = await protocol.read_message(reader, protocol.RESPONSE)
+                future = self._pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, payload))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+            # Ответы на запросы этого соединения уже не придут
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ModelNotReadyError("Соединение с сервером инференса потеряно"))
+            self._pending.clear()
+
+    async def request(self, op: int, payload: bytes = b"", session_key=None, priority: bool = False):
+        if len(payload) > protocol.MAX_PAYLOAD:
+            # Сайдкар закрыл бы общее соединение, и упали бы все запросы этого воркера
+            raise InvalidImageError(f"Изображение больше {protocol.MAX_PAYLOAD // (1024 * 1024)} МБ")
+        writer = await self._connect()
+        request_id = next(self._ids) & 0xFFFFFFFF
+        flags = (protocol.FLAG_PRIORITY if priority else 0) | (protocol.FLAG_SESSION if session_key is not None else 0)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        writer.writelines([
+            protocol.REQUEST.pack(op, flags, request_id, int(session_key or 0), len(payload)),
+            payload,
+        ])
+        try:
+            await writer.drain()
+            status, payload = await future
+        except ConnectionError as e:
+            raise ModelNotReadyError(f"Сервер инференса недоступен: {e}")
+        finally:
+            self._pending.pop(request_id, None)
+
+        if status == protocol.OK:
+            return payload
+        if status == protocol.INVALID_IMAGE:
+            raise InvalidImageError(payload.decode())
+        if status == protocol.NOT_READY:
+            raise ModelNotReadyError(payload.decode())
+        if status == protocol.OVERLOADED:
+            raise OverloadedError(*protocol.OVERLOAD.unpack(payload))
+        raise RuntimeError(payload.decode())
+
+    async def detect(self, image_bytes: bytes, session_key=None, priority: bool = False) -> dict:
+        payload = await self.request(protocol.OP_DETECT, image_bytes, session_key, priority)
+        return protocol.decode_detection(payload)
+
+    async def reset_session(self, session_key):
+        await self.request(protocol.OP_RESET, session_key=session_key)
+
+    async def smoothed_gesture(self, session_key) -> Optional[str]:
+        (code,) = protocol.GESTURE.unpack(await self.request(protocol.OP_SMOOTHED, session_key=session_key))
+        gesture = protocol.GESTURES[code]
+        return None if gesture == protocol.NO_DETECTION else gesture
+
+    async def status(self) -> dict:
+        try:
+            payload = await self.request(protocol.OP_STATUS)
+        except ModelNotReadyError as e:
+            return {"ready": False, "error": str(e), "load_seconds": None}
+        ready, load_seconds = protocol.STATUS.unpack_from(payload)
+        error = payload[protocol.STATUS.size:].decode() or None
+        return {"ready": ready, "error": error, "load_seconds": round(load_seconds, 3) if load_seconds >= 0 else None}
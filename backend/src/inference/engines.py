@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, List, Type
+
+import numpy as np
+
+from src.inference.model import MODEL_PATH, parse_result
+from src.inference.preprocess import letterbox_into, unletterbox_bbox
+
+
+def weights_fingerprint(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def _export_lock(weights_path: str):
+    # Экспорт может одновременно начаться в нескольких процессах uvicorn –
+    # сериализуем его файловой блокировкой рядом с весами (на Windows блокировки нет)
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(weights_path + ".export.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class InferenceEngine:
+    """
+    Движок инференса жестов. Наследники задают формат артефакта модели;
+    экспортированные артефакты кешируются рядом с best.pt и пересобираются
+    только при изменении весов или размера входа.
+    Кадры батча вписываются (letterbox) прямо в заранее выделенные буферы движка,
+    поэтому на каждый батч не создаются новые массивы входа. Графы экспортируются
+    с динамическим размером входа, так что кадры можно гнать в разном imgsz.
+    """
+
+    name = None
+    export_format = None
+    precisions = ("fp32",)
+
+    def __init__(self, weights_path: str = MODEL_PATH, imgsz: int = 640,
+                 precision: str = "fp32", calibration_data: str = None):
+        if precision not in self.precisions:
+            raise ValueError(f"Backend {self.name} does not support precision {precision}")
+        if precision == "int8" and not calibration_data:
+            raise ValueError("INT8 quantization needs a calibration dataset (INFERENCE_CALIBRATION_DATA)")
+        self.weights_path = weights_path
+        self.imgsz = imgsz
+        self.precision = precision
+        # YAML датасета ultralytics, чей split val – отложенные кадры для калибровки INT8
+        self.calibration_data = calibration_data
+        self.model = None
+        # imgsz -> (uint8 (N, imgsz, imgsz, 3) BGR, float32 torch-тензор (N, 3, imgsz, imgsz) RGB в [0, 1])
+        self._buffers_by_size = {}
+
+    def artifact_path(self) -> str:
+        return self.weights_path
+
+    def _artifact_stem(self) -> str:
+        stem = os.path.splitext(self.weights_path)[0]
+        return stem + "_int8" if self.precision == "int8" else stem
+
+    def _manifest_path(self) -> str:
+        return self.artifact_path().rstrip("/\\") + ".source.json"
+
+    def _manifest(self) -> dict:
+        return {
+            "weights_sha256": weights_fingerprint(self.weights_path),
+            "format": self.export_format,
+            "imgsz": self.imgsz,
+            "precision": self.precision,
+            "calibration_data": self.calibration_data if self.precision == "int8" else None,
+        }
+
+    def is_artifact_fresh(self) -> bool:
+        if not os.path.exists(self.artifact_path()) or not os.path.exists(self._manifest_path()):
+            return False
+        with open(self._manifest_path()) as f:
+            return json.load(f) == self._manifest()
+
+    def export(self) -> str:
+        from ultralytics import YOLO
+        return YOLO(self.weights_path).export(format=self.export_format, imgsz=self.imgsz, dynamic=True)
+
+    def prepare(self):
+        """Гарантирует актуальный артефакт (экспортирует, если кеш устарел)."""
+        if self.export_format is None:
+            return
+        with _export_lock(self.weights_path):
+            self._build()
+
+    def _build(self):
+        # Вызывается под блокировкой экспорта
+        if self.is_artifact_fresh():
+            return
+        self.export()
+        with open(self._manifest_path(), "w") as f:
+            json.dump(self._manifest(), f)
+
+    def load(self):
+        from ultralytics import YOLO
+        self.model = YOLO(self.artifact_path(), task="detect")
+        return self
+
+    def warmup(self, sizes=None):
+        """Прогон пустого кадра в каждом размере входа: первая реальная детекция не платит за инициализацию."""
+        for imgsz in sizes or [self.imgsz]:
+            self.predict([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)], [imgsz])
+
+    def _buffers(self, batch_size: int, imgsz: int):
+        buffers = self._buffers_by_size.get(imgsz)
+        if buffers is None or len(buffers[0]) < batch_size:
+            import torch
+            buffers = self._buffers_by_size[imgsz] = (
+                np.empty((batch_size, imgsz, imgsz, 3), dtype=np.uint8),
+                torch.empty((batch_size, 3, imgsz, imgsz), dtype=torch.float32),
+            )
+        return buffers[0][:batch_size], buffers[1][:batch_size]
+
+    def preprocess(self, frames, imgsz: int = None):
+        import torch
+        buffer, tensor = self._buffers(len(frames), imgsz or self.imgsz)
+        params = [letterbox_into(frame, buffer[i]) for i, frame in enumerate(frames)]
+        # BGR NHWC uint8 -> RGB NCHW float по каналам, без временных тензоров
+        source = torch.from_numpy(buffer).permute(0, 3, 1, 2)
+        for dst_channel, src_channel in ((0, 2), (1, 1), (2, 0)):
+            tensor[:, dst_channel].copy_(source[:, src_channel])
+        tensor.div_(255)
+        return tensor, params
+
+    def infer(self, tensor):
+        # Тензор уже нужного размера, поэтому ultralytics пропускает свой letterbox
+        return self.model(tensor, verbose=False)
+
+    def postprocess(self, results, frames, params) -> List[dict]:
+        detections = []
+        for result, frame, (scale, pad_x, pad_y) in zip(results, frames, params):
+            detection = parse_result(result)
+            if detection["bbox"]:
+                height, width = frame.shape[:2]
+                detection["bbox"] = unletterbox_bbox(detection["bbox"], scale, pad_x, pad_y, width, height)
+            detections.append(detection)
+        return detections
+
+    def predict(self, frames, sizes=None) -> List[dict]:
+        """
+        Детекция по батчу кадров. sizes – размер входа модели для каждого кадра
+        (None – self.imgsz); кадры с одинаковым размером идут одним прямым проходом.
+        """
+        sizes = sizes or [self.imgsz] * len(frames)
+        groups: Dict[int, List[int]] = {}
+        for index, imgsz in enumerate(sizes):
+            groups.setdefault(imgsz or self.imgsz, []).append(index)
+
+        detections = [None] * len(frames)
+        for imgsz, indexes in groups.items():
+            group = [frames[i] for i in indexes]
+            tensor, params = self.preprocess(group, imgsz)
+            for i, detection in zip(indexes, self.postprocess(self.infer(tensor), group, params)):
+                detections[i] = detection
+        return detections
+
+
+def val_images(data_yaml: str, limit: int = 300) -> List[str]:
+    """Пути к кадрам split val датасета ultralytics (для калибровки – отложенная выборка)."""
+    from ultralytics.data.utils import IMG_FORMATS, check_det_dataset
+    val = check_det_dataset(data_yaml)["val"]
+    paths = []
+    for entry in val if isinstance(val, list) else [val]:
+        for root, _, names in os.walk(entry):
+            paths.extend(os.path.join(root, name) for name in sorted(names)
+                         if name.rsplit(".", 1)[-1].lower() in IMG_FORMATS)
+    return paths[:limit]
+
+
+class _CalibrationReader:
+    """Калибровочные тензоры для onnxruntime: тот же letterbox, что и в продакшн-пути."""
+
+    def __init__(self, engine: InferenceEngine, input_name: str):
+        self.engine = engine
+        self.input_name = input_name
+        self.paths = iter(val_images(engine.calibration_data))
+
+    def get_next(self):
+        import cv2
+        for path in self.paths:
+            frame = cv2.imread(path)
+            if frame is not None:
+                tensor, _ = self.engine.preprocess([frame])
+                return {self.input_name: tensor.numpy().copy()}
+        return None
+
+
+class TorchEngine(InferenceEngine):
+    name = "torch"
+
+
+class OnnxEngine(InferenceEngine):
+    """Граф ONNX, исполняемый ONNX Runtime на CPU."""
+
+    name = "onnx"
+    export_format = "onnx"
+
+    precisions = ("fp32", "int8")
+
+    def artifact_path(self) -> str:
+        return self._artifact_stem() + ".onnx"
+
+    def export(self) -> str:
+        if self.precision != "int8":
+            return super().export()
+        # ultralytics не квантует ONNX, поэтому экспортируем FP32-граф и прогоняем
+        # статическую квантизацию ONNX Runtime (QDQ, веса по каналам) на калибровочных кадрах
+        import onnx
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+        fp32_engine = OnnxEngine(self.weights_path, self.imgsz)
+        fp32_engine._build()  # блокировка экспорта уже взята в prepare()
+        fp32_path = fp32_engine.artifact_path()
+        quantize_static(
+            fp32_path,
+            self.artifact_path(),
+            _CalibrationReader(self, onnx.load(fp32_path).graph.input[0].name),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+        # Метаданные (классы, stride, imgsz) нужны ultralytics при загрузке графа
+        source, quantized = onnx.load(fp32_path), onnx.load(self.artifact_path())
+        quantized.metadata_props.extend(source.metadata_props)
+        onnx.save(quantized, self.artifact_path())
+        return self.artifact_path()
+
+
+class OpenVinoEngine(InferenceEngine):
+    """Модель OpenVINO IR (каталог <веса>_openvino_model рядом с best.pt)."""
+
+    name = "openvino"
+    export_format = "openvino"
+
+    precisions = ("fp32", "int8")
+
+    def artifact_path(self) -> str:
+        return self._artifact_stem() + "_openvino_model"
+
+    def export(self) -> str:
+        if self.precision != "int8":
+            return super().export()
+        # Пост-тренировочная квантизация NNCF на кадрах calibration_data; ultralytics
+        # сам кладёт результат в <веса>_int8_openvino_model
+        from ultralytics import YOLO
+        return YOLO(self.weights_path).export(
+            format=self.export_format, imgsz=self.imgsz, dynamic=True,
+            int8=True, data=self.calibration_data,
+        )
+
+
+ENGINES: Dict[str, Type[InferenceEngine]] = {
+    engine.name: engine for engine in (TorchEngine, OnnxEngine, OpenVinoEngine)
+}
+
+
+def create_engine(backend: str, weights_path: str = MODEL_PATH, imgsz: int = 640,
+                  precision: str = "fp32", calibration_data: str = None) -> InferenceEngine:
+    if backend not in ENGINES:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    return ENGINES[backend](weights_path=weights_path, imgsz=imgsz,
+                            precision=precision, calibration_data=calibration_data)
@@ -0,0 +1,18 @@
+class InvalidImageError(ValueError):
+    """Присланные байты не удалось декодировать в изображение."""
+
+
+class ModelNotReadyError(RuntimeError):
+    """Модель ещё загружается (или не загрузилась) – детекция пока недоступна."""
+
+
+class OverloadedError(RuntimeError):
+    """
+    Очередь инференса заполнена; retry_after – через сколько секунд повторить,
+    scan_interval_ms – рекомендуемый интервал фоновых кадров при текущей загрузке.
+    """
+
+    def __init__(self, retry_after: int, scan_interval_ms: int):
+        super().__init__("Сервер детекции перегружен")
+        self.retry_after = retry_after
+        self.scan_interval_ms = scan_interval_ms
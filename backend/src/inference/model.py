@@ -0,0 +1,44 @@
+import os
+
+# Веса модели лежат рядом с роутером детекции (backend/src/api/best.pt)
+MODEL_PATH = os.getenv(
+    "MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api", "best.pt")
+)
+
+# Соответствие классов жестам
+class_names = {0: "Paper", 1: "Rock", 2: "Scissors"}
+
+NO_DETECTION = "No detection"
+
+
+def parse_result(result) -> dict:
+    """
+    Лучший бокс из Results YOLO (ultralytics сортирует боксы по уверенности).
+    bbox – float в координатах входа модели, пересчёт делают вызывающие.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return {"gesture": NO_DETECTION, "confidence": 0.0, "bbox": []}
+    box = boxes[0]
+    cls = int(box.cls[0])
+    return {
+        "gesture": class_names.get(cls, "Unknown"),
+        "confidence": float(box.conf[0]),
+        "bbox": box.xyxy[0].tolist(),
+    }
+
+
+def to_source_coords(detection: dict, scale: float = 1.0, roi=None) -> dict:
+    """Переводит bbox из координат декодированного кадра (или кропа roi) в координаты исходника."""
+    if not detection["bbox"]:
+        return detection
+    offset_x, offset_y = (roi[0], roi[1]) if roi else (0, 0)
+    x1, y1, x2, y2 = detection["bbox"]
+    bbox = [x1 * scale + offset_x, y1 * scale + offset_y, x2 * scale + offset_x, y2 * scale + offset_y]
+    return dict(detection, bbox=bbox)
+
+
+def to_response(detection: dict) -> dict:
+    """Ответ /model/detect: bbox в целых координатах исходного изображения."""
+    return {"gesture": detection["gesture"], "bbox": [int(value) for value in detection["bbox"]]}
@@ -0,0 +1,127 @@
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Цвет полей при letterbox – как в ultralytics, чтобы не менять распределение входа модели
+PAD_VALUE = 114
+
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def probe_image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """Читает (ширину, высоту) из заголовка JPEG/PNG без декодирования пикселей."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return width, height
+    if data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def choose_reduction(width: int, height: int, imgsz: int) -> int:
+    """
+    Максимальный коэффициент уменьшения (4, 2 или 1), при котором длинная сторона
+    кадра всё ещё не меньше входа модели – модель всё равно сожмёт кадр до imgsz.
+    """
+    for factor in (4, 2):
+        if max(width, height) // factor >= imgsz:
+            return factor
+    return 1
+
+
+def decode_image(image_bytes: bytes, imgsz: int, roi=None):
+    """
+    Декодирует кадр сразу в уменьшенном разрешении (IMREAD_REDUCED_COLOR_2/4),
+    если нужная область заметно больше входа модели. Если задан roi
+    (x1, y1, x2, y2 в координатах исходного изображения), возвращается только
+    эта область – без копирования, как срез декодированного кадра.
+    Возвращает (кадр, масштаб, применённый roi или None, (ширина, высота) исходника)
+    или None для битого изображения.
+    """
+    import cv2
+    if not image_bytes:
+        return None
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4}
+    size = probe_image_size(image_bytes)
+    if size is None:
+        roi = None
+    elif roi is not None:
+        roi = clamp_box(roi, *size)
+        if roi[2] - roi[0] < 2 or roi[3] - roi[1] < 2:
+            roi = None
+    if size is None:
+        factor = 1
+    elif roi is not None:
+        factor = choose_reduction(roi[2] - roi[0], roi[3] - roi[1], imgsz)
+    else:
+        factor = choose_reduction(*size, imgsz)
+
+    frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flags[factor])
+    if frame is None:
+        return None
+    # Сравниваем длинные стороны: imdecode может повернуть кадр по EXIF
+    scale = max(size) / max(frame.shape[:2]) if size and factor > 1 else 1.0
+    if size is None:
+        size = (frame.shape[1], frame.shape[0])
+    elif (frame.shape[1], frame.shape[0]) != (round(size[0] / scale), round(size[1] / scale)):
+        roi = None  # кадр повёрнут по EXIF, координаты roi к нему не подходят
+
+    if roi is not None:
+        x1, y1 = int(roi[0] / scale), int(roi[1] / scale)
+        x2, y2 = int(np.ceil(roi[2] / scale)), int(np.ceil(roi[3] / scale))
+        frame = frame[y1:y2, x1:x2]
+        roi = (x1 * scale, y1 * scale, x2 * scale, y2 * scale)
+    return frame, scale, roi, size
+
+
+def clamp_box(box, width: int, height: int):
+    x1, y1, x2, y2 = box
+    return (min(max(x1, 0), width), min(max(y1, 0), height),
+            min(max(x2, 0), width), min(max(y2, 0), height))
+
+
+def letterbox_into(frame: np.ndarray, out: np.ndarray) -> Tuple[float, int, int]:
+    """
+    Вписывает кадр в квадратный буфер out (imgsz x imgsz x 3) с сохранением пропорций,
+    без промежуточных массивов. Возвращает (scale, pad_x, pad_y) для обратного пересчёта bbox.
+    """
+    import cv2
+    size = out.shape[0]
+    height, width = frame.shape[:2]
+    scale = min(size / width, size / height)
+    new_w, new_h = max(1, round(width * scale)), max(1, round(height * scale))
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+
+    out.fill(PAD_VALUE)
+    region = out[pad_y:pad_y + new_h, pad_x:pad_x + new_w]
+    resized = cv2.resize(frame, (new_w, new_h), dst=region, interpolation=cv2.INTER_LINEAR)
+    if not np.shares_memory(resized, out):
+        region[...] = resized
+    return scale, pad_x, pad_y
+
+
+def unletterbox_bbox(bbox, scale: float, pad_x: int, pad_y: int, width: int, height: int):
+    """Переводит bbox из координат буфера модели обратно в координаты кадра."""
+    x1, y1, x2, y2 = bbox
+    return list(clamp_box(
+        ((x1 - pad_x) / scale, (y1 - pad_y) / scale, (x2 - pad_x) / scale, (y2 - pad_y) / scale),
+        width, height,
+    ))
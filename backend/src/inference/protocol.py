@@ -0,0 +1,74 @@
+"""
+Двоичный протокол между API-воркерами и сайдкаром инференса (Unix-сокет).
+
+Запрос:  REQUEST (операция, флаги, id запроса, ключ сессии, длина) + данные (JPEG/PNG для OP_DETECT).
+Ответ:   RESPONSE (статус, id запроса, длина) + данные, формат зависит от операции и статуса.
+Ответы приходят в порядке готовности, клиент сопоставляет их с запросами по id.
+"""
+import struct
+from typing import Optional
+
+from src.inference.model import NO_DETECTION, class_names
+
+REQUEST = struct.Struct("!BBIqI")
+RESPONSE = struct.Struct("!BII")
+# Жест, bbox, есть ли сводка сессии, сглаженный жест, его уверенность, stable, scan_interval_ms
+DETECTION = struct.Struct("!B4i?Bf?I")
+# retry_after (с), scan_interval_ms
+OVERLOAD = struct.Struct("!HI")
+# ready, load_seconds (< 0 – неизвестно); дальше – текст ошибки загрузки в UTF-8
+STATUS = struct.Struct("!?f")
+GESTURE = struct.Struct("!B")
+
+OP_DETECT, OP_RESET, OP_SMOOTHED, OP_STATUS = 1, 2, 3, 4
+FLAG_PRIORITY, FLAG_SESSION = 1, 2
+OK, INVALID_IMAGE, NOT_READY, OVERLOADED, FAILED = 0, 1, 2, 3, 4
+
+# Кадр больше этого считается ошибкой протокола – соединение закрывается
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+GESTURES = (NO_DETECTION, *class_names.values(), "Unknown")
+_GESTURE_CODES = {gesture: code for code, gesture in enumerate(GESTURES)}
+
+
+def encode_gesture(gesture: Optional[str]) -> int:
+    return _GESTURE_CODES.get(gesture or NO_DETECTION, _GESTURE_CODES["Unknown"])
+
+
+def encode_detection(response: dict) -> bytes:
+    """Ответ detect_bytes -> DETECTION."""
+    bbox = response["bbox"] or [0, 0, 0, 0]
+    has_summary = "smoothed_gesture" in response
+    return DETECTION.pack(
+        encode_gesture(response["gesture"]), *bbox,
+        has_summary,
+        encode_gesture(response.get("smoothed_gesture")),
+        response.get("smoothed_confidence", 0.0),
+        response.get("stable", False),
+        response["scan_interval_ms"],
+    )
+
+
+def decode_detection(payload: bytes) -> dict:
+    gesture, x1, y1, x2, y2, has_summary, smoothed, confidence, stable, interval = DETECTION.unpack(payload)
+    response = {
+        "gesture": GESTURES[gesture],
+        "bbox": [x1, y1, x2, y2] if GESTURES[gesture] != NO_DETECTION else [],
+        "scan_interval_ms": interval,
+    }
+    if has_summary:
+        response.update(
+            smoothed_gesture=GESTURES[smoothed],
+            smoothed_confidence=round(confidence, 3),
+            stable=stable,
+        )
+    return response
+
+
+async def read_message(reader, header: struct.Struct):
+    """Читает заголовок и данные одного сообщения; последним полем заголовка идёт длина данных."""
+    fields = header.unpack(await reader.readexactly(header.size))
+    if fields[-1] > MAX_PAYLOAD:
+        raise ValueError(f"Payload too large: {fields[-1]} bytes")
+    payload = await reader.readexactly(fields[-1]) if fields[-1] else b""
+    return fields, payload
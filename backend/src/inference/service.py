@@ -0,0 +1,245 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import AsyncIterator, Optional, Tuple
+
+from src.config import settings
+from src.inference.batcher import MicroBatcher
+from src.inference.client import SidecarClient
+from src.inference.errors import InvalidImageError, ModelNotReadyError, OverloadedError
+from src.inference.model import NO_DETECTION, to_response, to_source_coords
+from src.inference.sessions import GestureAggregator, RoiTracker, SessionStore
+from src.inference.workers import InferencePool
+
+# В режиме sidecar модель, батчер и сессии живут в процессе src.inference.sidecar,
+# а публичные функции ниже пересылают ему запросы; объекты пула и сессий этого
+# процесса тогда не используются (пул не стартует, модель не загружается)
+client = SidecarClient(settings.INFERENCE_SOCKET) if settings.INFERENCE_MODE == "sidecar" else None
+
+
+pool = InferencePool(
+    backend=settings.INFERENCE_BACKEND,
+    imgsz=settings.INFERENCE_IMGSZ,
+    mode=settings.INFERENCE_WORKER_MODE,
+    workers=settings.INFERENCE_WORKERS,
+    torch_threads=settings.INFERENCE_TORCH_THREADS,
+    decode_threads=settings.INFERENCE_DECODE_THREADS,
+    warmup_sizes=[settings.INFERENCE_IMGSZ, settings.INFERENCE_ROI_IMGSZ],
+    precision=settings.INFERENCE_PRECISION,
+    calibration_data=settings.INFERENCE_CALIBRATION_DATA,
+)
+
+batcher = MicroBatcher(
+    pool.run_batch,
+    settings.INFERENCE_MAX_BATCH_SIZE,
+    settings.INFERENCE_MAX_WAIT_MS,
+    max_concurrency=pool.workers,
+    max_queue_size=settings.INFERENCE_MAX_QUEUE,
+    priority_wait_ms=settings.INFERENCE_PRIORITY_WAIT_MS,
+)
+
+
+sessions = SessionStore(
+    ttl=settings.INFERENCE_SESSION_TTL,
+    history_size=settings.INFERENCE_AGGREGATE_FRAMES,
+)
+
+roi_tracker = RoiTracker(
+    sessions,
+    padding=settings.INFERENCE_ROI_PADDING,
+    min_confidence=settings.INFERENCE_ROI_MIN_CONFIDENCE,
+    max_roi_frames=settings.INFERENCE_ROI_MAX_FRAMES,
+)
+
+aggregator = GestureAggregator(
+    sessions,
+    window=settings.INFERENCE_AGGREGATE_WINDOW_S,
+    min_confidence=settings.INFERENCE_STABLE_MIN_CONFIDENCE,
+    stable_frames=settings.INFERENCE_STABLE_FRAMES,
+)
+
+
+# Готовность модели для /readyz: воркеры загружены и прогреты.
+# fatal – загрузка не удалась и после всех повторов (для /healthz)
+readiness = {"ready": False, "error": None, "load_seconds": None, "attempts": 0, "fatal": False}
+
+
+async def start():
+    """Запуск инференса при старте приложения (в режиме sidecar модель грузит сайдкар)."""
+    if client is None:
+        await start_local()
+
+
+async def start_local():
+    """
+    Фоновая загрузка движков во все воркеры с прогревом на пустом кадре. Пул, в котором
+    упал initializer воркера, больше не работает, поэтому каждый повтор идёт на новом пуле.
+    """
+    started = time.perf_counter()
+    backoff = settings.INFERENCE_WARMUP_BACKOFF_S
+    while True:
+        readiness["attempts"] += 1
+        try:
+            await pool.warmup()
+            break
+        except Exception as e:
+            readiness["error"] = str(e)
+            pool.shutdown()
+            if readiness["attempts"] >= settings.INFERENCE_WARMUP_ATTEMPTS:
+                readiness["fatal"] = True
+                print(f"Inference warm-up failed after {readiness['attempts']} attempts: {e}")
+                return
+            print(f"Inference warm-up failed (attempt {readiness['attempts']}), retrying in {backoff} s: {e}")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+    readiness["error"] = None
+    readiness["load_seconds"] = round(time.perf_counter() - started, 3)
+    readiness["ready"] = True
+    print(f"Inference ready in {readiness['load_seconds']} s")
+
+
+async def status() -> dict:
+    """Готовность модели: {"ready", "error", "load_seconds"}."""
+    if client is not None:
+        return await client.status()
+    return dict(readiness)
+
+
+async def ensure_ready():
+    current = await status()
+    if not current["ready"]:
+        raise ModelNotReadyError(current["error"] or "Модель загружается")
+
+
+def ensure_ready_local():
+    if not readiness["ready"]:
+        raise ModelNotReadyError(readiness["error"] or "Модель загружается")
+
+
+async def reset_session(session_key):
+    """Начало нового раунда: история жестов сессии сбрасывается (roi сохраняется)."""
+    if client is not None:
+        return await client.reset_session(session_key)
+    reset_local(session_key)
+
+
+def reset_local(session_key):
+    sessions.reset_history(session_key)
+
+
+async def smoothed_gesture(session_key) -> Optional[str]:
+    """Сглаженный жест сессии за последнее окно или None, если руки не было."""
+    if client is not None:
+        return await client.smoothed_gesture(session_key)
+    return smoothed_local(session_key)
+
+
+def smoothed_local(session_key) -> Optional[str]:
+    gesture = aggregator.summary(session_key)["smoothed_gesture"]
+    return None if gesture == NO_DETECTION else gesture
+
+
+def scan_interval_ms() -> int:
+    """Рекомендуемый клиентам интервал между фоновыми кадрами при текущей загрузке очереди."""
+    low, high = settings.INFERENCE_SCAN_INTERVAL_MS, settings.INFERENCE_SCAN_INTERVAL_MAX_MS
+    return int(low + (high - low) * batcher.load)
+
+
+def overloaded() -> OverloadedError:
+    interval = scan_interval_ms()
+    return OverloadedError(math.ceil(interval / 1000), interval)
+
+
+def ensure_admitted(priority: bool = False):
+    if batcher.is_full(priority):
+        raise overloaded()
+
+
+async def detect_bytes(image_bytes: bytes, session_key=None, priority: bool = False) -> dict:
+    """Детекция жеста на кадре – в этом процессе или в сайдкаре (см. detect_local)."""
+    if client is not None:
+        return await client.detect(image_bytes, session_key, priority)
+    return await detect_local(image_bytes, session_key, priority)
+
+
+async def detect_local(image_bytes: bytes, session_key=None, priority: bool = False) -> dict:
+    """
+    Декодирует кадр в пуле потоков и ставит его в очередь батчевого инференса.
+    session_key (id пользователя) включает слежение за рукой и сглаживание жеста:
+    пока рука находится уверенно, кадры сессии обрабатываются по кропу и в меньшем
+    размере входа, а в ответ добавляются smoothed_gesture, smoothed_confidence и stable.
+    priority=True – кадр, от которого зависит результат (финальный жест), идёт вне очереди.
+    При заполненной очереди – OverloadedError; в ответе всегда есть scan_interval_ms.
+    """
+    ensure_ready_local()
+    ensure_admitted(priority)
+    roi = roi_tracker.region(session_key) if session_key is not None else None
+    imgsz = settings.INFERENCE_ROI_IMGSZ if roi else settings.INFERENCE_IMGSZ
+    decoded = await pool.decode(image_bytes, imgsz, roi)
+    if decoded is None:
+        raise InvalidImageError("Неверное изображение")
+    frame, scale, roi, size = decoded
+    try:
+        detection = await batcher.submit((frame, settings.INFERENCE_ROI_IMGSZ if roi else None), priority)
+    except asyncio.QueueFull:
+        # Очередь успела заполниться, пока кадр декодировался
+        raise overloaded()
+    detection = to_source_coords(detection, scale, roi)
+    response = to_response(detection)
+    response["scan_interval_ms"] = scan_interval_ms()
+    if session_key is not None:
+        roi_tracker.update(session_key, detection, roi is not None, size)
+        response.update(aggregator.add(session_key, detection))
+    return response
+
+
+# Кадры пакетной детекции в очереди модели – на все запросы процесса (INFERENCE_BULK_MAX_INFLIGHT)
+bulk_slots = asyncio.Semaphore(max(1, settings.INFERENCE_BULK_MAX_INFLIGHT))
+
+
+async def detect_bulk_frame(data: bytes) -> dict:
+    """
+    Кадр пакетной детекции – фоновая работа: занимает один из общих bulk_slots и уступает
+    интерактивным кадрам, пока обычная полоса очереди загружена больше INFERENCE_BULK_QUEUE_SHARE
+    (загрузку очереди сайдкара отсюда не видно – там остаётся только лимит bulk_slots).
+    При переполненной очереди не отказывает, а ждёт, пока она разгрузится.
+    """
+    async with bulk_slots:
+        while True:
+            if client is None and batcher.load >= settings.INFERENCE_BULK_QUEUE_SHARE:
+                await asyncio.sleep(settings.INFERENCE_MAX_WAIT_MS / 1000)
+                continue
+            try:
+                return await detect_bytes(data)
+            except OverloadedError:
+                await asyncio.sleep(settings.INFERENCE_SCAN_INTERVAL_MS / 1000)
+
+
+async def detect_many(images: AsyncIterator[Tuple[str, bytes]], concurrency: int) -> AsyncIterator[dict]:
+    """
+    Детекция по потоку изображений (имя, байты) без сессий. До concurrency кадров
+    одновременно читаются и ждут очереди модели (см. detect_bulk_frame); результаты отдаются
+    в исходном порядке в том же формате, что и detect_bytes, плюс index и name.
+    """
+    async def run(index, name, data):
+        # Ошибка одного изображения не должна обрывать весь поток результатов
+        try:
+            result = await detect_bulk_frame(data)
+        except Exception as e:
+            result = {"error": str(e)}
+        return dict({"index": index, "name": name}, **result)
+
+    window = deque()
+    try:
+        index = 0
+        async for name, data in images:
+            window.append(asyncio.ensure_future(run(index, name, data)))
+            index += 1
+            if len(window) >= concurrency:
+                yield await window.popleft()
+        while window:
+            yield await window.popleft()
+    finally:
+        for task in window:
+            task.cancel()
@@ -0,0 +1,132 @@
+import time
+from collections import deque
+from typing import Dict, Hashable, Optional, Tuple
+
+from src.inference.model import NO_DETECTION
+
+
+class DetectionSession:
+    """Состояние детекции одного пользователя между кадрами."""
+
+    def __init__(self, history_size: int):
+        self.roi: Optional[Tuple[float, float, float, float]] = None
+        self.roi_frames = 0  # сколько кадров подряд обработано по roi
+        self.history = deque(maxlen=history_size)  # (время, жест, уверенность)
+        self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    """Сессии детекции по ключу (id пользователя); неактивные дольше ttl секунд удаляются."""
+
+    def __init__(self, ttl: float = 60, history_size: int = 8):
+        self.ttl = ttl
+        self.history_size = history_size
+        self.sessions: Dict[Hashable, DetectionSession] = {}
+        self._touches = 0
+
+    def get(self, key: Hashable) -> Optional[DetectionSession]:
+        return self.sessions.get(key)
+
+    def touch(self, key: Hashable) -> DetectionSession:
+        session = self.sessions.get(key)
+        if session is None:
+            session = self.sessions[key] = DetectionSession(self.history_size)
+        session.last_seen = time.monotonic()
+        self._touches += 1
+        if self._touches % 256 == 0:
+            self.evict_expired()
+        return session
+
+    def reset_history(self, key: Hashable):
+        session = self.sessions.get(key)
+        if session is not None:
+            session.history.clear()
+
+    def evict_expired(self):
+        deadline = time.monotonic() - self.ttl
+        for key in [key for key, s in self.sessions.items() if s.last_seen < deadline]:
+            del self.sessions[key]
+
+
+class RoiTracker:
+    """
+    Слежение за областью руки: после уверенной детекции следующие кадры сессии
+    обрабатываются по кропу вокруг последнего bbox (с полями padding от его размера).
+    На промахе или после max_roi_frames кадров подряд снова берётся полный кадр.
+    """
+
+    def __init__(self, store: SessionStore, padding: float = 0.5,
+                 min_confidence: float = 0.5, max_roi_frames: int = 10):
+        self.store = store
+        self.padding = padding
+        self.min_confidence = min_confidence
+        self.max_roi_frames = max_roi_frames
+
+    def region(self, key: Hashable):
+        """roi для следующего кадра сессии или None, если нужен полный кадр."""
+        session = self.store.get(key)
+        if session is None or session.roi is None:
+            return None
+        if session.roi_frames >= self.max_roi_frames:
+            session.roi = None
+            return None
+        return session.roi
+
+    def update(self, key: Hashable, detection: dict, used_roi: bool, size: Tuple[int, int]):
+        """detection – результат кадра с bbox в координатах исходного изображения."""
+        session = self.store.touch(key)
+        session.roi_frames = session.roi_frames + 1 if used_roi else 0
+
+        if detection["bbox"] and detection["confidence"] >= self.min_confidence:
+            x1, y1, x2, y2 = detection["bbox"]
+            pad = self.padding * max(x2 - x1, y2 - y1)
+            width, height = size
+            session.roi = (max(x1 - pad, 0), max(y1 - pad, 0),
+                           min(x2 + pad, width), min(y2 + pad, height))
+        else:
+            session.roi = None
+            session.roi_frames = 0
+
+
+class GestureAggregator:
+    """
+    Сглаживание жеста по последним кадрам сессии (не старше window секунд).
+    Сглаженный жест – жест с наибольшей суммарной уверенностью, его уверенность –
+    эта сумма, делённая на число кадров в окне (промахи тянут её вниз).
+    stable=True, когда последние stable_frames кадров дали этот же жест с уверенностью
+    не ниже min_confidence – после этого клиенту можно больше не присылать кадры.
+    """
+
+    def __init__(self, store: SessionStore, window: float = 4.0,
+                 min_confidence: float = 0.5, stable_frames: int = 3):
+        self.store = store
+        self.window = window
+        self.min_confidence = min_confidence
+        self.stable_frames = stable_frames
+
+    def add(self, key: Hashable, detection: dict) -> dict:
+        session = self.store.touch(key)
+        session.history.append((time.monotonic(), detection["gesture"], detection["confidence"]))
+        return self.summary(key)
+
+    def summary(self, key: Hashable) -> dict:
+        session = self.store.get(key)
+        now = time.monotonic()
+        frames = [(g, c) for t, g, c in session.history if now - t <= self.window] if session else []
+        weights: Dict[str, float] = {}
+        for gesture, confidence in frames:
+            if gesture != NO_DETECTION:
+                weights[gesture] = weights.get(gesture, 0.0) + confidence
+        if not weights:
+            return {"smoothed_gesture": NO_DETECTION, "smoothed_confidence": 0.0, "stable": False}
+
+        gesture = max(weights, key=weights.get)
+        recent = frames[-self.stable_frames:]
+        stable = len(recent) == self.stable_frames and all(
+            g == gesture and c >= self.min_confidence for g, c in recent
+        )
+        return {
+            "smoothed_gesture": gesture,
+            "smoothed_confidence": round(weights[gesture] / len(frames), 3),
+            "stable": stable,
+        }
@@ -0,0 +1,95 @@
+"""
+Сайдкар инференса: один процесс держит модель(и), батчер и сессии детекции,
+API-воркеры uvicorn (INFERENCE_MODE=sidecar) пересылают ему кадры по Unix-сокету
+(протокол – src/inference/protocol.py). Память под модели не растёт с числом воркеров.
+
+Запуск из каталога backend:
+    python -m src.inference.sidecar
+    INFERENCE_MODE=sidecar uvicorn src.main:app --workers 4
+"""
+import asyncio
+import os
+
+from src.config import settings
+from src.inference import protocol, service
+from src.inference.errors import InvalidImageError, ModelNotReadyError, OverloadedError
+
+
+async def handle_request(op: int, flags: int, session_key: int, payload: bytes):
+    """Выполняет запрос локальным сервисом инференса; возвращает (статус, данные ответа)."""
+    key = session_key if flags & protocol.FLAG_SESSION else None
+    try:
+        if op == protocol.OP_DETECT:
+            response = await service.detect_local(payload, key, bool(flags & protocol.FLAG_PRIORITY))
+            return protocol.OK, protocol.encode_detection(response)
+        if op == protocol.OP_RESET:
+            service.reset_local(key)
+            return protocol.OK, b""
+        if op == protocol.OP_SMOOTHED:
+            return protocol.OK, protocol.GESTURE.pack(protocol.encode_gesture(service.smoothed_local(key)))
+        if op == protocol.OP_STATUS:
+            readiness = service.readiness
+            load_seconds = readiness["load_seconds"] if readiness["load_seconds"] is not None else -1
+            return protocol.OK, protocol.STATUS.pack(readiness["ready"], load_seconds) + (readiness["error"] or "").encode()
+        return protocol.FAILED, f"Unknown operation: {op}".encode()
+    except InvalidImageError as e:
+        return protocol.INVALID_IMAGE, str(e).encode()
+    except ModelNotReadyError as e:
+        return protocol.NOT_READY, str(e).encode()
+    except OverloadedError as e:
+        return protocol.OVERLOADED, protocol.OVERLOAD.pack(e.retry_after, e.scan_interval_ms)
+    except Exception as e:
+        return protocol.FAILED, str(e).encode()
+
+
+async def serve_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    # Запросы соединения выполняются параллельно, чтобы кадры разных клиентов
+    # одного API-воркера попадали в общие батчи
+    tasks = set()
+
+    async def respond(op, flags, request_id, session_key, payload):
+        status, data = await handle_request(op, flags, session_key, payload)
+        writer.writelines([protocol.RESPONSE.pack(status, request_id, len(data)), data])
+        await writer.drain()
+
+    try:
+        while True:
+            (op, flags, request_id, session_key, _), payload = await protocol.read_message(reader, protocol.REQUEST)
+            task = asyncio.get_running_loop().create_task(respond(op, flags, request_id, session_key, payload))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        writer.close()
+
+
+async def serve(path: str = settings.INFERENCE_SOCKET):
+    if os.path.exists(path):
+        os.unlink(path)  # сокет, оставшийся от прошлого запуска
+    server = await asyncio.start_unix_server(serve_connection, path=path)
+    print(f"Inference sidecar listening on {path}")
+    # Соединения принимаются сразу, а пока модель грузится, отвечаем NOT_READY
+    loading = asyncio.get_running_loop().create_task(service.start_local())
+    try:
+        async with server:
+            serving = asyncio.get_running_loop().create_task(server.serve_forever())
+            await loading
+            if service.readiness["fatal"]:
+                # Без модели сайдкар бесполезен: завершаемся, чтобы супервизор его перезапустил
+                raise SystemExit(f"Inference warm-up failed: {service.readiness['error']}")
+            await serving
+    finally:
+        loading.cancel()
+        service.pool.shutdown()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,189 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import List
+
+import numpy as np
+
+from src.inference.engines import create_engine
+from src.inference.preprocess import decode_image
+
+# Движок потока (режим "thread") – у каждого потока своя копия, т.к. предиктор YOLO
+# хранит состояние между вызовами и не потокобезопасен
+_local = threading.local()
+
+# Движок процесса (режим "process") – загружается один раз в initializer воркера
+_process_engine = None
+
+
+def _set_torch_threads(torch_threads: int):
+    if torch_threads > 0:
+        import torch
+        torch.set_num_threads(torch_threads)
+
+
+def _load_engine(engine_options: dict, warmup_sizes=None):
+    # Экспорт артефакта (если нужен) защищён файловой блокировкой, поэтому
+    # первый воркер собирает его, а остальные просто загружают готовый
+    engine = create_engine(**engine_options)
+    engine.prepare()
+    engine.load()
+    engine.warmup(warmup_sizes)
+    return engine
+
+
+def _thread_engine(engine_options: dict):
+    engine = getattr(_local, "engine", None)
+    if engine is None:
+        engine = _local.engine = _load_engine(engine_options)
+    return engine
+
+
+def _thread_infer(engine_options: dict, frames, sizes) -> List[dict]:
+    return _thread_engine(engine_options).predict(frames, sizes)
+
+
+def _init_thread(engine_options: dict, warmup_sizes):
+    _local.engine = _load_engine(engine_options, warmup_sizes)
+
+
+def _init_process(engine_options: dict, torch_threads: int, warmup_sizes):
+    global _process_engine
+    _set_torch_threads(torch_threads)
+    _process_engine = _load_engine(engine_options, warmup_sizes)
+
+
+def _noop():
+    return None
+
+
+def _process_infer(shm_name: str, layout, sizes) -> List[dict]:
+    # Кадры не копируются: numpy-представления смотрят прямо в сегмент shared memory,
+    # движок читает их только при letterbox в свой буфер
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frames = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                  for offset, shape in layout]
+        outputs = _process_engine.predict(frames, sizes)
+        del frames
+        return outputs
+    finally:
+        shm.close()
+
+
+def _pack_frames(frames):
+    """Укладывает кадры батча подряд в один новый сегмент shared memory."""
+    total = sum(frame.nbytes for frame in frames)
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+    layout = []
+    offset = 0
+    for frame in frames:
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+        view[...] = frame
+        del view
+        layout.append((offset, frame.shape))
+        offset += frame.nbytes
+    return shm, layout
+
+
+class InferencePool:
+    """
+    Пул воркеров инференса, чтобы декодирование и YOLO не блокировали event loop.
+    backend выбирает движок ("torch", "onnx", "openvino", см. engines.py), precision –
+    "fp32" или "int8" (onnx/openvino, квантизация по калибровочному датасету calibration_data).
+    mode="thread": модели в потоках текущего процесса, кадры передаются без копирования.
+    mode="process": модели в отдельных процессах (загружаются при старте воркера),
+    кадры батча передаются через один сегмент shared memory.
+    Декодирование JPEG всегда идёт в отдельном пуле потоков (cv2 отпускает GIL),
+    сразу в уменьшенном разрешении, если кадр намного больше входа модели.
+    """
+
+    def __init__(self, backend: str = "torch", imgsz: int = 640, mode: str = "thread",
+                 workers: int = 1, torch_threads: int = 0, decode_threads: int = 2,
+                 warmup_sizes=None, precision: str = "fp32", calibration_data: str = None):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown inference worker mode: {mode}")
+        self.backend = backend
+        self.imgsz = imgsz
+        self.precision = precision
+        self.engine_options = {"backend": backend, "imgsz": imgsz,
+                               "precision": precision, "calibration_data": calibration_data}
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads
+        self.decode_threads = max(1, decode_threads)
+        self.warmup_sizes = warmup_sizes or [imgsz]
+        self._executor = None
+        self._decode_executor = None
+
+    def start(self):
+        if self._executor is not None:
+            return
+        self._decode_executor = ThreadPoolExecutor(
+            max_workers=self.decode_threads, thread_name_prefix="decode"
+        )
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+                initargs=(self.engine_options, self.torch_threads, self.warmup_sizes),
+            )
+        else:
+            _set_torch_threads(self.torch_threads)
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="inference",
+                initializer=_init_thread,
+                initargs=(self.engine_options, self.warmup_sizes),
+            )
+
+    async def warmup(self):
+        """
+        Поднимает все воркеры: каждый при старте загружает движок и прогревает его
+        (см. _init_thread/_init_process). Пулы создают воркеры по требованию, поэтому
+        одновременная отправка workers пустых задач запускает их все.
+        Заодно импортирует cv2 в пуле декодирования.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        decode_warmup = loop.run_in_executor(self._decode_executor, decode_image, b"", self.imgsz)
+        await asyncio.gather(
+            decode_warmup,
+            *(loop.run_in_executor(self._executor, _noop) for _ in range(self.workers))
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._decode_executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._decode_executor = None
+
+    async def decode(self, image_bytes: bytes, imgsz: int = None, roi=None):
+        """См. preprocess.decode_image: (кадр, масштаб, roi, размер исходника) или None."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._decode_executor, decode_image, image_bytes, imgsz or self.imgsz, roi
+        )
+
+    async def run_batch(self, items) -> List[dict]:
+        """items – список (кадр, imgsz); imgsz None означает размер входа по умолчанию."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        frames = [frame for frame, _ in items]
+        sizes = [imgsz for _, imgsz in items]
+        if self.mode == "thread":
+            return await loop.run_in_executor(
+                self._executor, _thread_infer, self.engine_options, frames, sizes
+            )
+
+        shm, layout = await loop.run_in_executor(self._decode_executor, _pack_frames, frames)
+        try:
+            return await loop.run_in_executor(self._executor, _process_infer, shm.name, layout, sizes)
+        finally:
+            shm.close()
+            shm.unlink()
@@ -1,19 +1,65 @@
+import asyncio
+import importlib
 import os
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from src.api import auth, user, game, admin, model_inference, multiplayer, multiplayer_result
+from src.config import settings
+
+# Импортируем роутеры по одному и замеряем время: тяжёлые зависимости (ultralytics, cv2, torch)
+# должны грузиться лениво в воркерах инференса, а не при импорте приложения
+_import_started = time.perf_counter()
+_import_times = {}
+for _name in ["auth", "user", "game", "admin", "model_inference", "detect_stream",
+              "multiplayer", "multiplayer_result", "health"]:
+    _started = time.perf_counter()
+    importlib.import_module(f"src.api.{_name}")
+    _import_times[_name] = round((time.perf_counter() - _started) * 1000, 1)
+
+from src.api import auth, user, game, admin, model_inference, detect_stream, multiplayer, multiplayer_result, health
 from src.database.base import Base
 from src.database.session import engine
+from src.inference import service as inference_service
 
-Base.metadata.create_all(bind=engine)
+health.import_report.update(
+    modules_ms=_import_times,
+    total_ms=round((time.perf_counter() - _import_started) * 1000, 1),
+    budget_ms=settings.IMPORT_TIME_BUDGET_MS,
+)
+health.import_report["over_budget"] = health.import_report["total_ms"] > settings.IMPORT_TIME_BUDGET_MS
+print(f"Import time: {health.import_report['total_ms']} ms (budget {settings.IMPORT_TIME_BUDGET_MS} ms)", _import_times)
+if health.import_report["over_budget"]:
+    print("WARNING: import time budget exceeded")
 
 app = FastAPI(
     title="Rock-Paper-Scissors Game API",
     websocket_origins=["http://localhost", "http://localhost:5500", "null"]
 )
 
+# Ссылка на фоновую задачу загрузки модели, чтобы её не собрал сборщик мусора
+background_tasks = set()
+
+@app.on_event("startup")
+async def startup():
+    Base.metadata.create_all(bind=engine)
+    health.loop_lag.start()
+    # Модель грузится в фоне: авторизация, лидерборд и статика доступны сразу,
+    # а /readyz начинает отвечать 200 после прогрева всех воркеров
+    task = asyncio.create_task(inference_service.start())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+@app.on_event("shutdown")
+def shutdown_inference_pool():
+    inference_service.pool.shutdown()
+
+@app.on_event("shutdown")
+async def shutdown_multiplayer():
+    # В режиме local здесь дописываются отложенные результаты боёв
+    await multiplayer.backend.shutdown()
+
 origins = ["*"]
 
 app.add_middleware(
@@ -30,8 +76,10 @@ app.include_router(user.router, prefix="/user", tags=["User"])
 app.include_router(game.router, prefix="/game", tags=["Game"])
 app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 app.include_router(model_inference.router, prefix="/model", tags=["Model"])
+app.include_router(detect_stream.router)
 app.include_router(multiplayer.router)
 app.include_router(multiplayer_result.router, prefix="/multiplayer", tags=["Multiplayer"])
+app.include_router(health.router, tags=["Health"])
 
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 html_path = os.path.join(project_root, "frontend", "html")
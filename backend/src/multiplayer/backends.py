@@ -0,0 +1,214 @@
+import asyncio
+import itertools
+import uuid
+from typing import Dict
+
+from src.config import settings
+from src.multiplayer import broker, protocol
+from src.multiplayer.connection import Connection
+from src.multiplayer.hub import MatchHub
+
+
+class LocalConnections:
+    """
+    Веб-сокеты игроков, принятые этим процессом, по id соединения.
+    Общая часть бэкендов: регистрирует соединения и раскладывает сообщения хаба
+    по их исходящим очередям (src/multiplayer/connection.py), не дожидаясь сети.
+    """
+
+    def __init__(self):
+        self.connections: Dict[str, Connection] = {}
+        self.dropped = 0  # сообщения, выброшенные из очередей уже закрытых соединений
+        self.slow_disconnects = 0
+        self.heartbeat = settings.MULTIPLAYER_HEARTBEAT_S
+        self._heartbeat_task = None
+
+    def connect(self, websocket, binary: bool = False) -> str:
+        conn = uuid.uuid4().hex  # уникален и между воркерами/машинами
+        self.connections[conn] = Connection(
+            websocket,
+            max_queue=settings.MULTIPLAYER_SEND_QUEUE,
+            policy=settings.MULTIPLAYER_SLOW_CONSUMER,
+            send_timeout=settings.MULTIPLAYER_SEND_TIMEOUT_S,
+            binary=binary,
+        )
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.get_running_loop().create_task(self._send_heartbeats())
+        return conn
+
+    async def _send_heartbeats(self):
+        # Клиент отвечает на ping сообщением pong; соединение, от которого дольше
+        # MULTIPLAYER_IDLE_TIMEOUT_S ничего не приходит, закрывает эндпоинт
+        while self.connections:
+            await asyncio.sleep(self.heartbeat)
+            self.deliver(list(self.connections), protocol.PING_TEXT)
+
+    def is_connected(self, conn: str) -> bool:
+        return conn in self.connections
+
+    def forget(self, conn: str):
+        connection = self.connections.pop(conn, None)
+        if connection is not None:
+            connection.discard()
+            self.dropped += connection.dropped
+            self.slow_disconnects += connection.slow
+
+    def deliver(self, conn_ids, text: str = None, raw: bytes = None):
+        """
+        Раскладывает сообщение (text или непрозрачный signal raw, см. protocol.split) по очередям;
+        кадр для текстовых и для бинарных клиентов собирается не больше одного раза.
+        """
+        frames = {}
+        for conn in conn_ids:
+            connection = self.connections.get(conn)
+            if connection is None:
+                continue
+            if connection.binary not in frames:
+                encode = protocol.to_binary if connection.binary else protocol.to_text
+                try:
+                    frames[connection.binary] = encode(text, raw)
+                except ValueError:
+                    frames[connection.binary] = None  # signal не JSON – текстовым клиентам не уходит
+            frame = frames[connection.binary]
+            if frame is not None:
+                connection.push(frame)
+
+    async def send(self, conn_ids, message: dict):
+        self.deliver(conn_ids, *protocol.split(message))
+
+    async def close(self, conn: str, code: int):
+        connection = self.connections.get(conn)
+        if connection is not None:
+            connection.close(code)
+
+    def outbound_stats(self) -> dict:
+        """Исходящие очереди соединений этого процесса."""
+        queued = [connection.queued for connection in self.connections.values()]
+        return {
+            "connections": len(queued),
+            "queued_max": max(queued, default=0),
+            "dropped": self.dropped + sum(connection.dropped for connection in self.connections.values()),
+            "slow_disconnects": self.slow_disconnects + sum(connection.slow for connection in self.connections.values()),
+        }
+
+
+class InProcessBackend(LocalConnections):
+    """Хаб в процессе API: по умолчанию, подходит для одного воркера uvicorn."""
+
+    def __init__(self):
+        super().__init__()
+        self.hub = MatchHub(self)
+
+    async def handle(self, conn: str, data: dict):
+        await self.hub.handle(conn, data)
+
+    async def disconnect(self, conn: str):
+        await self.hub.disconnect(conn)
+        self.forget(conn)
+
+    async def stats(self) -> dict:
+        return self.hub.stats()
+
+    async def shutdown(self):
+        await self.hub.close()
+
+
+class BrokerBackend(LocalConnections):
+    """
+    Хаб в отдельном процессе-брокере (src/multiplayer/broker.py), общем для всех воркеров.
+    Одно соединение с брокером на процесс, открывается лениво; если оно оборвалось,
+    веб-сокеты этого воркера закрываются – брокер уже считает их игроков отключёнными.
+    """
+
+    def __init__(self, address: str):
+        super().__init__()
+        self.address = address
+        self._writer = None
+        self._reader_task = None
+        self._lock = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+
+    async def _connect(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            try:
+                reader, writer = await broker.open_connection(self.address)
+            except OSError as e:
+                raise ConnectionError(f"Брокер онлайн-режима недоступен: {e}")
+            self._writer = writer
+            self._reader_task = asyncio.get_running_loop().create_task(self._read_loop(reader, writer))
+            return writer
+
+    async def _post(self, frame: dict, payload: bytes = b""):
+        writer = await self._connect()
+        writer.write(broker.encode_frame(frame, payload))
+        await writer.drain()
+
+    async def _read_loop(self, reader, writer):
+        try:
+            while True:
+                frame, payload = await broker.read_frame(reader)
+                if frame["t"] == "send":
+                    # Текст сообщения сериализован брокером один раз для всех получателей,
+                    # непрозрачный signal пришёл хвостом кадра
+                    self.deliver(frame["c"], frame["m"], payload if frame["m"] is None else None)
+                elif frame["t"] == "close":
+                    await self.close(frame["c"], frame["code"])
+                elif frame["t"] == "stats":
+                    future = self._pending.pop(frame["id"], None)
+                    if future is not None and not future.done():
+                        future.set_result(frame["d"])
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Соединение с брокером онлайн-режима потеряно"))
+            self._pending.clear()
+            for conn in list(self.connections):
+                await self.close(conn, 1012)
+
+    async def handle(self, conn: str, data: dict):
+        raw = data.get("raw")
+        if isinstance(raw, bytes):
+            data = {key: value for key, value in data.items() if key != "raw"}
+            await self._post({"t": "msg", "c": conn, "d": data}, raw)
+        else:
+            await self._post({"t": "msg", "c": conn, "d": data})
+
+    async def disconnect(self, conn: str):
+        self.forget(conn)
+        try:
+            await self._post({"t": "close", "c": conn})
+        except ConnectionError:
+            pass
+
+    async def stats(self) -> dict:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._post({"t": "stats", "id": request_id})
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def shutdown(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def create_backend():
+    """Бэкенд состояния онлайн-режима по settings.MULTIPLAYER_BACKEND."""
+    if settings.MULTIPLAYER_BACKEND == "broker":
+        return BrokerBackend(settings.MULTIPLAYER_BROKER)
+    if settings.MULTIPLAYER_BACKEND != "local":
+        raise ValueError(f"Unknown multiplayer backend: {settings.MULTIPLAYER_BACKEND}")
+    return InProcessBackend()
@@ -0,0 +1,172 @@
+"""
+Брокер онлайн-режима: один процесс держит очередь подбора и все матчи (MatchHub),
+а API-воркеры (MULTIPLAYER_BACKEND=broker) только принимают веб-сокеты игроков
+и пересылают их сообщения сюда. Так игроки с разных воркеров и даже разных машин
+попадают в общую очередь, а число веб-сокетов масштабируется числом воркеров.
+
+Связь воркер <-> брокер – кадры "две длины + JSON-заголовок + байты" по Unix-сокету (путь)
+или TCP (host:port). Байты – непрозрачный signal бинарного клиента (src/multiplayer/protocol.py),
+в JSON он не попадает:
+    воркер -> брокер: {"t": "msg", "c": conn_id, "d": сообщение игрока} (+ байты signal как "raw"),
+                      {"t": "close", "c": conn_id}, {"t": "stats", "id": n}
+    брокер -> воркер: {"t": "send", "c": [conn_id, ...], "m": текст сообщения (JSON) или null + байты signal},
+                      {"t": "close", "c": conn_id, "code": код},
+                      {"t": "stats", "id": n, "d": статистика}
+
+Запуск из каталога backend:
+    python -m src.multiplayer.broker
+    MULTIPLAYER_BACKEND=broker uvicorn src.main:app --workers 4
+"""
+import asyncio
+import json
+import os
+import struct
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from src.config import settings
+from src.multiplayer import protocol
+from src.multiplayer.hub import MatchHub
+
+FRAME = struct.Struct("!II")  # длина JSON-заголовка, длина байтов
+# Кадр больше этого считается ошибкой протокола – соединение закрывается
+MAX_FRAME = 1024 * 1024
+
+
+def encode_frame(frame: dict, payload: bytes = b"") -> bytes:
+    data = json.dumps(frame, ensure_ascii=False).encode()
+    return FRAME.pack(len(data), len(payload)) + data + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[dict, bytes]:
+    length, payload_length = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if length + payload_length > MAX_FRAME:
+        raise ValueError(f"Frame too large: {length + payload_length} bytes")
+    frame = json.loads(await reader.readexactly(length))
+    payload = await reader.readexactly(payload_length) if payload_length else b""
+    return frame, payload
+
+
+def is_unix_address(address: str) -> bool:
+    return ":" not in address or address.startswith("/")
+
+
+async def open_connection(address: str):
+    if is_unix_address(address):
+        return await asyncio.open_unix_connection(address)
+    host, port = address.rsplit(":", 1)
+    return await asyncio.open_connection(host, int(port))
+
+
+class Broker:
+    """Транспорт хаба: маршрутизирует сообщения игрокам на воркеры, принявшие их соединения."""
+
+    def __init__(self):
+        self.hub = MatchHub(self)
+        self.routes: Dict[str, asyncio.StreamWriter] = {}  # conn_id -> соединение воркера
+        # Сообщения одного игрока обрабатываются по очереди, разных игроков – параллельно
+        self.inboxes: Dict[str, asyncio.Queue] = {}
+        self.tasks = set()
+
+    async def _write(self, writer: asyncio.StreamWriter, frame: dict, payload: bytes = b""):
+        if writer.is_closing():
+            return
+        writer.write(encode_frame(frame, payload))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def send(self, conn_ids, message: dict):
+        # Сообщение сериализуется один раз, нескольким игрокам одного воркера – один кадр
+        text, raw = protocol.split(message)
+        by_worker = defaultdict(list)
+        for conn in conn_ids:
+            writer = self.routes.get(conn)
+            if writer is not None:
+                by_worker[writer].append(conn)
+        for writer, conns in by_worker.items():
+            await self._write(writer, {"t": "send", "c": conns, "m": text}, raw or b"")
+
+    async def close(self, conn: str, code: int):
+        writer = self.routes.get(conn)
+        if writer is not None:
+            await self._write(writer, {"t": "close", "c": conn, "code": code})
+
+    def is_connected(self, conn: str) -> bool:
+        return conn in self.routes
+
+    def dispatch(self, writer: asyncio.StreamWriter, frame: dict):
+        conn = frame["c"]
+        inbox = self.inboxes.get(conn)
+        if inbox is None:
+            if frame["t"] == "close":
+                return
+            self.routes[conn] = writer
+            inbox = self.inboxes[conn] = asyncio.Queue()
+            task = asyncio.get_running_loop().create_task(self._process(conn, inbox))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        inbox.put_nowait(frame)
+
+    async def _process(self, conn: str, inbox: asyncio.Queue):
+        try:
+            while True:
+                frame = await inbox.get()
+                if frame["t"] == "close":
+                    break
+                try:
+                    await self.hub.handle(conn, frame["d"])
+                except Exception as e:
+                    print(f"Multiplayer message from {conn} failed: {e}")
+        finally:
+            try:
+                await self.hub.disconnect(conn)
+            finally:
+                self.inboxes.pop(conn, None)
+                self.routes.pop(conn, None)
+
+    async def serve_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                frame, payload = await read_frame(reader)
+                if payload and frame["t"] == "msg":
+                    frame["d"]["raw"] = payload
+                if frame["t"] == "stats":
+                    await self._write(writer, {"t": "stats", "id": frame["id"], "d": self.hub.stats()})
+                else:
+                    self.dispatch(writer, frame)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            # Воркер упал или перезапустился – его игроки отключены
+            for conn, owner in list(self.routes.items()):
+                if owner is writer and conn in self.inboxes:
+                    self.inboxes[conn].put_nowait({"t": "close", "c": conn})
+            writer.close()
+
+
+async def serve(address: str = settings.MULTIPLAYER_BROKER):
+    broker = Broker()
+    if is_unix_address(address):
+        if os.path.exists(address):
+            os.unlink(address)  # сокет, оставшийся от прошлого запуска
+        server = await asyncio.start_unix_server(broker.serve_worker, path=address)
+    else:
+        host, port = address.rsplit(":", 1)
+        server = await asyncio.start_server(broker.serve_worker, host, int(port))
+    print(f"Multiplayer broker listening on {address}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await broker.hub.close()
+        if is_unix_address(address) and os.path.exists(address):
+            os.unlink(address)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,102 @@
+import asyncio
+import json
+from collections import deque
+
+SLOW_CONSUMER_POLICIES = ("disconnect", "drop")
+# Код закрытия для клиента, который не успевает принимать сообщения (RFC 6455: Try Again Later)
+CLOSE_SLOW_CONSUMER = 1013
+
+
+def serialize(message: dict) -> str:
+    """Сообщение -> текст кадра, как в WebSocket.send_json; делается один раз на всех получателей."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class Connection:
+    """
+    Исходящая сторона веб-сокета игрока: ограниченная очередь готовых кадров и задача-писатель.
+    push не ждёт сети, поэтому рассылка матча и таймеры боя не зависят от самого медленного клиента.
+    Если очередь переполнена (клиент не успевает или завис), по политике policy либо
+    выбрасывается самое старое сообщение ("drop"), либо соединение закрывается ("disconnect").
+    Отправка дольше send_timeout считается зависанием и тоже закрывает соединение.
+    binary – клиент согласовал бинарный протокол (src/multiplayer/protocol.py): в очереди байты, а не текст.
+    """
+
+    def __init__(self, websocket, max_queue: int = 32, policy: str = "disconnect", send_timeout: float = 5,
+                 binary: bool = False):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.websocket = websocket
+        self.max_queue = max(1, max_queue)
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.binary = binary
+        self.dropped = 0
+        self.slow = False  # закрыто как медленный получатель
+        self._queue = deque()
+        self._wakeup = asyncio.Event()
+        self._close_code = None
+        self._task = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _ensure_started(self):
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def push(self, frame):
+        if self._close_code is not None:
+            return
+        if len(self._queue) >= self.max_queue:
+            if self.policy == "disconnect":
+                self.close_slow()
+                return
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append(frame)
+        self._ensure_started()
+
+    def close(self, code: int):
+        """Закрывает соединение после уже поставленных в очередь сообщений."""
+        if self._close_code is None:
+            self._close_code = code
+            self._ensure_started()
+
+    def close_slow(self):
+        self.slow = True
+        self.dropped += len(self._queue)
+        self._queue.clear()
+        self.close(CLOSE_SLOW_CONSUMER)
+
+    def discard(self):
+        """
+        Соединение больше не нужно: неотправленное выбрасывается. Если закрытие уже
+        запрошено, писатель его дошлёт (не дольше send_timeout), иначе останавливается.
+        """
+        self._queue.clear()
+        if self._task is not None and self._close_code is None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            while self._queue:
+                frame = self._queue.popleft()
+                send = self.websocket.send_bytes if isinstance(frame, bytes) else self.websocket.send_text
+                try:
+                    await asyncio.wait_for(send(frame), self.send_timeout)
+                except asyncio.TimeoutError:
+                    self.close_slow()
+                    break
+                except Exception:
+                    return  # клиент уже отключился
+            if self._close_code is not None:
+                try:
+                    await asyncio.wait_for(self.websocket.close(code=self._close_code), self.send_timeout)
+                except Exception:
+                    pass
+                return
+            self._wakeup.clear()
+            await self._wakeup.wait()
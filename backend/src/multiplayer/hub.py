@@ -0,0 +1,371 @@
+import asyncio
+from typing import Dict, Iterable, Optional
+
+from src.config import settings
+from src.multiplayer.matchmaker import Matchmaker, rating_from_stats
+from src.multiplayer.persistence import MatchRecord, ResultWriter
+
+# Тайминги боя, с: длительность, момент затемнения экрана противника и его длительность
+# (затемнение длится до конца боя), сколько после конца боя ждать финальные жесты,
+# прежде чем завершить бой без них
+BATTLE_DURATION = 10
+BLACKOUT_AFTER = 7
+BLACKOUT_DURATION = 3
+GESTURE_TIMEOUT = 5
+
+
+GESTURES = ("rock", "paper", "scissors")
+
+
+def clean_gesture(value) -> str:
+    """Жест от клиента как есть, если это rock/paper/scissors (в любом регистре), иначе "none"."""
+    if isinstance(value, str) and value.strip().lower() in GESTURES:
+        return value.strip()
+    return "none"
+
+
+def determine_result(gesture1: str, gesture2: str) -> str:
+    gesture1 = gesture1.strip().lower()
+    gesture2 = gesture2.strip().lower()
+    if gesture1 != "none" and gesture2 == "none":
+        return "win"
+    if gesture1 == "none" and gesture2 != "none":
+        return "loss"
+    if gesture1 == gesture2:
+        return "draw"
+    if (gesture1 == "rock" and gesture2 == "scissors") or \
+       (gesture1 == "scissors" and gesture2 == "paper") or \
+       (gesture1 == "paper" and gesture2 == "rock"):
+        return "win"
+    return "loss"
+
+
+def load_player_profile(user_id):
+    """(username, рейтинг) игрока по онлайн-статистике; для неизвестного id – рейтинг новичка."""
+    from src.database.session import SessionLocal
+    from src.database.models import User
+    if not str(user_id).isdigit():
+        return str(user_id), rating_from_stats(0, 0)
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == int(user_id)).first()
+        if not user:
+            return str(user_id), rating_from_stats(0, 0)
+        return user.username, rating_from_stats(user.online_wins, user.online_games)
+    finally:
+        db.close()
+
+
+def match_record(match, g1, g2, winner) -> Optional[MatchRecord]:
+    """Запись результата для БД или None, если среди игроков нет зарегистрированных id."""
+    player1, player2 = match["players"]
+    if not (str(player1["user_id"]).isdigit() and str(player2["user_id"]).isdigit()):
+        return None
+    resultValue = "draw" if winner == "draw" else ("player1" if winner == player1["user_id"] else "player2")
+    return MatchRecord(int(player1["user_id"]), int(player2["user_id"]), g1.lower(), g2.lower(), resultValue)
+
+
+class MatchHub:
+    """
+    Состояние онлайн-режима: очередь подбора, активные матчи и ход боя.
+    Хаб не знает о веб-сокетах: соединение – строковый id, сообщения игрокам уходят
+    через transport (async send(conn_ids, message), async close(conn_id, code)).
+    Поэтому один и тот же хаб работает и в процессе API (InProcessBackend), и в общем
+    для всех воркеров брокере (src/multiplayer/broker.py).
+    Сообщения одного соединения должны приходить в handle по очереди.
+
+    Транспорт сообщает хабу о закрытых соединениях через disconnect; если это по какой-то
+    причине не произошло, фоновый reap раз в MULTIPLAYER_REAP_INTERVAL_S убирает записи
+    соединений, которых у транспорта уже нет (transport.is_connected), и всё, что на них
+    ссылается: записи очереди, матчи с их таймерами, индексы.
+    """
+
+    def __init__(self, transport, load_profile=load_player_profile):
+        self.transport = transport
+        self.load_profile = load_profile
+        self.users: Dict[str, str] = {}  # conn_id -> user_id, после успешного join
+        self.active_matches: Dict[str, dict] = {}  # match_id -> { players, battle_started, gestures, play_again, concluded }
+        # Индексы для поиска матча за O(1) на каждое сообщение: conn_id -> match_id, user_id -> match_id.
+        # Обновляются только через register_match / remove_match
+        self.match_by_connection: Dict[str, str] = {}
+        self.match_by_user: Dict[str, str] = {}
+        # Отложенная запись результатов боёв (см. src/multiplayer/persistence.py)
+        self.result_writer = ResultWriter(
+            max_batch=settings.MULTIPLAYER_RESULTS_BATCH,
+            flush_interval_ms=settings.MULTIPLAYER_RESULTS_FLUSH_MS,
+        )
+        # Ссылки на фоновые задачи (announce_saved), чтобы их не собрал сборщик мусора
+        self.background_tasks = set()
+        self.matchmaker = Matchmaker(
+            self.start_match,
+            tick_ms=settings.MATCHMAKING_TICK_MS,
+            bucket_size=settings.MATCHMAKING_BUCKET_SIZE,
+            widen_every_s=settings.MATCHMAKING_WIDEN_EVERY_S,
+            max_window=settings.MATCHMAKING_MAX_WINDOW,
+        )
+        self.reap_interval = settings.MULTIPLAYER_REAP_INTERVAL_S
+        self.reaps = 0
+        self.leaked = {"connections": 0, "queue": 0, "matches": 0, "index": 0}  # найдено последним проходом
+        self.evicted = dict(self.leaked)  # убрано за всё время
+        self._reaper = None
+
+    def _ensure_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.get_running_loop().create_task(self._run_reaper())
+
+    async def send(self, players: Iterable[dict], message: dict):
+        await self.transport.send([p["conn"] for p in players], message)
+
+    async def handle(self, conn: str, data: dict):
+        """Сообщение игрока. Первым должно прийти join, иначе соединение закрывается."""
+        user_id = self.users.get(conn)
+        if user_id is None:
+            await self.join(conn, data)
+            return
+        action = data.get("action")
+        match, match_id = self.find_match_by_connection(conn)
+        if not match:
+            return
+        if action == "signal":
+            # От бинарного клиента signal приходит непрозрачными байтами (raw) и уходит сопернику как есть
+            relay = {"action": "signal", "raw": data["raw"]} if isinstance(data.get("raw"), bytes) else {"action": "signal", "data": data.get("data")}
+            await self.send([p for p in match["players"] if p["conn"] != conn], relay)
+        elif action == "ready":
+            for p in match["players"]:
+                if p["conn"] == conn:
+                    p["ready"] = True
+            if not match["battle_started"] and all(p["ready"] for p in match["players"]):
+                match["battle_started"] = True
+                match["concluded"] = False
+                # Срабатывает, когда пришли финальные жесты обоих игроков
+                match["gestures_in"] = asyncio.Event()
+                await self.send(match["players"], {"action": "battle_start", "duration": BATTLE_DURATION})
+                # Таймер боя: затемнение и завершение; отменяется при отключении игрока
+                match["timer"] = asyncio.create_task(self.send_blackout_and_end(match, match_id))
+        elif action == "unready":
+            for p in match["players"]:
+                if p["conn"] == conn:
+                    p["ready"] = False
+            await self.send(match["players"], {"action": "player_unready", "user_id": user_id})
+        elif action == "gesture":
+            gesture_value = data.get("gesture")
+            # Жесты приходят от клиента: в состояние матча (и в БД) попадают только допустимые
+            last_valid = clean_gesture(data.get("lastValidGesture"))
+            smoothed = clean_gesture(data.get("smoothed"))
+            if gesture_value is not None:
+                gesture_value = clean_gesture(gesture_value)
+                if gesture_value != "none":
+                    match["gestures"][user_id] = gesture_value
+                # Если финальный кадр пустой – берём жест, сглаженный сервером по кадрам раунда
+                # (его подставляет воркер, принявший сообщение), иначе последний жест клиента
+                elif smoothed != "none":
+                    match["gestures"][user_id] = smoothed
+                elif last_valid != "none":
+                    match["gestures"][user_id] = last_valid
+                elif user_id not in match["gestures"]:
+                    match["gestures"][user_id] = "none"
+                if match.get("gestures_in") and all(p["user_id"] in match["gestures"] for p in match["players"]):
+                    match["gestures_in"].set()
+        elif action == "play_again":
+            match["play_again"][user_id] = True
+            await self.send([p for p in match["players"] if p["user_id"] != user_id], {
+                "action": "opponent_play_again",
+                "message": f"Игрок {user_id} хочет сыграть ещё."
+            })
+            if len(match["play_again"]) == 2:
+                for p in match["players"]:
+                    p["ready"] = False
+                match["gestures"] = {}
+                match["play_again"] = {}
+                match["battle_started"] = False
+                match["concluded"] = False
+                await self.send(match["players"], {"action": "replay", "message": "Начните новую битву, нажмите 'Готов'."})
+
+    async def join(self, conn: str, data: dict):
+        if data.get("action") != "join" or "user_id" not in data:
+            await self.transport.close(conn, 1008)
+            return
+        user_id = data["user_id"]
+        if user_id in self.matchmaker or self.find_match_by_user(user_id):
+            await self.transport.send([conn], {"action": "error", "message": "Вы уже в очереди или в игре."})
+            await self.transport.close(conn, 1008)
+            return
+        username, rating = await asyncio.get_running_loop().run_in_executor(None, self.load_profile, user_id)
+        if not self.matchmaker.join({"user_id": user_id, "username": username, "conn": conn, "ready": False}, rating):
+            await self.transport.close(conn, 1008)
+            return
+        self.users[conn] = user_id
+        self._ensure_reaper()
+        await self.transport.send([conn], {"action": "status", "message": "Вы в очереди на игру."})
+
+    async def disconnect(self, conn: str):
+        """Соединение закрыто: убираем игрока из очереди, матч – с уведомлением соперника."""
+        user_id = self.users.pop(conn, None)
+        if user_id is None:
+            return
+        self.matchmaker.leave(user_id, conn)
+        match, match_id = self.find_match_by_connection(conn)
+        if match:
+            disconnect_msg = {"action": "disconnect", "message": f"Игрок {user_id} отключился."}
+            await self.send([p for p in match["players"] if p["conn"] != conn], disconnect_msg)
+            self.remove_match(match_id)
+
+    async def start_match(self, player1: dict, player2: dict):
+        """Колбэк matchmaker: создаёт матч для подобранной пары и сообщает игрокам."""
+        match_id = f"{player1['user_id']}_{player2['user_id']}"
+        self.register_match(match_id, {
+            "players": [player1, player2],
+            "battle_started": False,
+            "gestures": {},
+            "play_again": {},
+            "concluded": False
+        })
+        match_msg = {"action": "match_found", "match_id": match_id, "players": [player1["user_id"], player2["user_id"]]}
+        await self.send([player1, player2], match_msg)
+
+    def register_match(self, match_id: str, match: dict):
+        self.active_matches[match_id] = match
+        for p in match["players"]:
+            self.match_by_connection[p["conn"]] = match_id
+            self.match_by_user[str(p["user_id"])] = match_id
+
+    def remove_match(self, match_id: str):
+        match = self.active_matches.pop(match_id, None)
+        if not match:
+            return
+        timer = match.get("timer")
+        if timer and not timer.done() and timer is not asyncio.current_task():
+            timer.cancel()
+        for p in match["players"]:
+            # Игрок мог уже попасть в другой матч – чужие записи индекса не трогаем
+            if self.match_by_connection.get(p["conn"]) == match_id:
+                del self.match_by_connection[p["conn"]]
+            if self.match_by_user.get(str(p["user_id"])) == match_id:
+                del self.match_by_user[str(p["user_id"])]
+
+    def find_match_by_connection(self, conn: str):
+        match_id = self.match_by_connection.get(conn)
+        match = self.active_matches.get(match_id) if match_id is not None else None
+        return (match, match_id) if match else (None, None)
+
+    def find_match_by_user(self, user_id):
+        match_id = self.match_by_user.get(str(user_id))
+        return self.active_matches.get(match_id) if match_id is not None else None
+
+    async def announce_saved(self, match, saved: asyncio.Future):
+        """Когда результат записан, сообщает игрокам id игры (battle_end к этому моменту уже ушёл)."""
+        try:
+            game_id = await saved
+        except Exception:
+            return
+        await self.send(match["players"], {"action": "battle_saved", "game_id": game_id})
+
+    async def conclude_battle(self, match, match_id):
+        if match.get("concluded"):
+            return
+        match["concluded"] = True
+        for p in match["players"]:
+            if p["user_id"] not in match["gestures"]:
+                match["gestures"][p["user_id"]] = "none"
+        g1 = match["gestures"][match["players"][0]["user_id"]]
+        g2 = match["gestures"][match["players"][1]["user_id"]]
+        res = determine_result(g1, g2)
+        if res == "win":
+            winner = match["players"][0]
+        elif res == "loss":
+            winner = match["players"][1]
+        else:
+            winner = None
+        winner_id = winner["user_id"] if winner else "draw"
+        # Имя победителя уже есть в состоянии матча (загружено при входе в очередь)
+        winner_username = winner.get("username", winner_id) if winner else "draw"
+
+        # Результат пишется в БД в фоне пачками (write-behind), бой не ждёт диска
+        record = match_record(match, g1, g2, winner_id)
+        if record is not None:
+            task = asyncio.create_task(self.announce_saved(match, self.result_writer.submit(record)))
+            self.background_tasks.add(task)
+            task.add_done_callback(self.background_tasks.discard)
+
+        end_msg = {
+            "action": "battle_end",
+            "winner": winner_username,
+            "gestures": match["gestures"],
+            "game_id": None
+        }
+        await self.send(match["players"], end_msg)
+        match["battle_started"] = False
+
+    async def send_blackout_and_end(self, match, match_id):
+        """
+        Таймер боя: бой завершается, как только пришли жесты обоих игроков (событие gestures_in).
+        На BLACKOUT_AFTER секунде – затемнение, по его окончании (конец боя) игроки без жеста
+        получают capture и сразу шлют финальный кадр: сервер распознаёт кадры обоих вне очереди
+        в одном батче. Через GESTURE_TIMEOUT после этого бой завершается и без жестов.
+        """
+        gestures_in = match["gestures_in"]
+        try:
+            await asyncio.wait_for(gestures_in.wait(), BLACKOUT_AFTER)
+        except asyncio.TimeoutError:
+            await self.send(match["players"], {"action": "blackout", "duration": BLACKOUT_DURATION})
+            try:
+                await asyncio.wait_for(gestures_in.wait(), BLACKOUT_DURATION)
+            except asyncio.TimeoutError:
+                waiting = [p for p in match["players"] if p["user_id"] not in match["gestures"]]
+                await self.send(waiting, {"action": "capture"})
+                try:
+                    await asyncio.wait_for(gestures_in.wait(), GESTURE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    pass
+        await self.conclude_battle(match, match_id)
+
+    async def _run_reaper(self):
+        while self.users or self.active_matches or len(self.matchmaker):
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                print(f"Multiplayer reaper failed: {e}")
+
+    async def reap(self) -> dict:
+        """Один проход сборки: убирает записи, оставшиеся от закрытых соединений; возвращает найденное."""
+        leaked = {"connections": 0, "queue": 0, "matches": 0, "index": 0}
+        for conn in [conn for conn in self.users if not self.transport.is_connected(conn)]:
+            leaked["connections"] += 1
+            await self.disconnect(conn)
+        for player in self.matchmaker.players():
+            if self.users.get(player["conn"]) != player["user_id"]:
+                leaked["queue"] += 1
+                self.matchmaker.leave(player["user_id"], player["conn"])
+        for match_id, match in list(self.active_matches.items()):
+            alive = [p for p in match["players"] if p["conn"] in self.users]
+            if len(alive) < len(match["players"]):
+                leaked["matches"] += 1
+                await self.send(alive, {"action": "disconnect", "message": "Соперник потерял соединение."})
+                self.remove_match(match_id)
+        for index in (self.match_by_connection, self.match_by_user):
+            for key in [key for key, match_id in index.items() if match_id not in self.active_matches]:
+                leaked["index"] += 1
+                del index[key]
+        self.reaps += 1
+        self.leaked = leaked
+        for key, count in leaked.items():
+            self.evicted[key] += count
+        return leaked
+
+    def stats(self) -> dict:
+        timers = sum(1 for match in self.active_matches.values() if match.get("timer") and not match["timer"].done())
+        return dict(
+            self.matchmaker.stats(),
+            active_matches=len(self.active_matches),
+            connections=len(self.users),
+            battle_timers=timers,
+            index_entries=len(self.match_by_connection) + len(self.match_by_user),
+            reaper={"runs": self.reaps, "leaked_last_run": self.leaked, "evicted_total": self.evicted},
+        )
+
+    async def close(self):
+        """Дописывает отложенные результаты боёв (при остановке процесса)."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+        await self.result_writer.close()
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Optional
+
+
+def rating_from_stats(online_wins: Optional[int], online_games: Optional[int], prior_games: int = 10) -> int:
+    """
+    Рейтинг 0..1000 по доле онлайн-побед. Доля сглажена к 50% так, будто у игрока уже есть
+    prior_games игр с половиной побед: новичок получает 500, а не 0 или 1000 после первой игры.
+    """
+    wins, games = online_wins or 0, online_games or 0
+    return round(1000 * (wins + prior_games / 2) / (games + prior_games))
+
+
+class QueueEntry:
+    def __init__(self, player: dict, rating: int, bucket: int):
+        self.player = player  # { "user_id", "conn", "ready", ... } – уходит в матч как есть
+        self.rating = rating
+        self.bucket = bucket
+        self.joined_at = time.monotonic()
+
+
+class Matchmaker:
+    """
+    Очередь поиска соперника с учётом рейтинга.
+    Игроки раскладываются по корзинам рейтинга шириной bucket_size; раз в tick_ms
+    фоновая задача проходит очередь от самых давно ждущих и подбирает каждому
+    ближайшего по корзине соперника в окне ±window корзин. Окно растёт на одну
+    корзину каждые widen_every_s секунд ожидания (до max_window), так что игрок
+    с редким рейтингом рано или поздно получает матч.
+    Все операции очереди – O(1): словарь по user_id и упорядоченные корзины.
+    """
+
+    def __init__(self, on_match: Callable[[dict, dict], Awaitable[None]], tick_ms: float = 500,
+                 bucket_size: int = 50, widen_every_s: float = 5, max_window: int = 20,
+                 stats_size: int = 1000):
+        self.on_match = on_match
+        self.tick = tick_ms / 1000
+        self.bucket_size = max(1, bucket_size)
+        self.widen_every = widen_every_s
+        self.max_window = max_window
+        self._entries: Dict[str, QueueEntry] = {}  # user_id -> запись, в порядке входа в очередь
+        self._buckets: Dict[int, "OrderedDict[str, QueueEntry]"] = {}
+        self._waits = deque(maxlen=stats_size)  # время до матча последних пар, с
+        self.matched = 0
+        self._task = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def __contains__(self, user_id) -> bool:
+        return str(user_id) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def players(self):
+        """Ожидающие игроки (копия списка – очередь можно менять во время обхода)."""
+        return [entry.player for entry in self._entries.values()]
+
+    def join(self, player: dict, rating: int) -> bool:
+        """Ставит игрока в очередь; False, если этот пользователь уже ждёт."""
+        key = str(player["user_id"])
+        if key in self._entries:
+            return False
+        bucket = rating // self.bucket_size
+        entry = self._entries[key] = QueueEntry(player, rating, bucket)
+        self._buckets.setdefault(bucket, OrderedDict())[key] = entry
+        self._ensure_started()
+        return True
+
+    def leave(self, user_id, conn=None):
+        """Убирает игрока из очереди (если conn задан – только запись этого соединения)."""
+        key = str(user_id)
+        entry = self._entries.get(key)
+        if entry is None or (conn is not None and entry.player["conn"] != conn):
+            return
+        del self._entries[key]
+        bucket = self._buckets[entry.bucket]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[entry.bucket]
+
+    def _window(self, entry: QueueEntry, now: float) -> int:
+        return min(self.max_window, int((now - entry.joined_at) / self.widen_every))
+
+    def _find_opponent(self, entry: QueueEntry, now: float) -> Optional[QueueEntry]:
+        # Сначала своя корзина, потом соседние по мере удаления
+        for distance in range(self._window(entry, now) + 1):
+            for bucket in {entry.bucket - distance, entry.bucket + distance}:
+                for candidate in self._buckets.get(bucket, {}).values():
+                    if candidate is not entry:
+                        return candidate
+        return None
+
+    def pair_waiting(self):
+        """Один проход подбора пар; возвращает список пар (player1, player2)."""
+        now = time.monotonic()
+        pairs = []
+        for entry in list(self._entries.values()):
+            if str(entry.player["user_id"]) not in self._entries:
+                continue  # уже в паре на этом проходе
+            opponent = self._find_opponent(entry, now)
+            if opponent is None:
+                continue
+            for matched in (entry, opponent):
+                self.leave(matched.player["user_id"])
+                self._waits.append(now - matched.joined_at)
+            self.matched += 1
+            pairs.append((entry.player, opponent.player))
+        return pairs
+
+    async def _run(self):
+        while self._entries:
+            for player1, player2 in self.pair_waiting():
+                try:
+                    await self.on_match(player1, player2)
+                except Exception as e:
+                    print(f"Matchmaking callback failed: {e}")
+            await asyncio.sleep(self.tick)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def percentile(q):
+            return round(waits[min(len(waits) - 1, int(q / 100 * len(waits)))], 3) if waits else None
+
+        return {
+            "queue_depth": len(self._entries),
+            "buckets": {bucket * self.bucket_size: len(entries) for bucket, entries in sorted(self._buckets.items())},
+            "matched_pairs": self.matched,
+            "time_to_match_s": {"p50": percentile(50), "p95": percentile(95), "max": round(waits[-1], 3) if waits else None},
+        }
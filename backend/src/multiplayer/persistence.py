@@ -0,0 +1,147 @@
+import asyncio
+from collections import defaultdict
+from typing import List, Optional
+
+_STOP = object()  # признак остановки в очереди ResultWriter
+
+
+class MatchRecord:
+    """Результат боя для записи в БД; result – "player1", "player2" или "draw"."""
+
+    def __init__(self, player1_id: int, player2_id: int, player1_gesture: str, player2_gesture: str, result: str):
+        self.player1_id = player1_id
+        self.player2_id = player2_id
+        self.player1_gesture = player1_gesture
+        self.player2_gesture = player2_gesture
+        self.result = result
+
+
+def write_records(records: List[MatchRecord], session_factory=None) -> List[int]:
+    """
+    Пишет пачку результатов одной транзакцией: строки MultiplayerGame и атомарные
+    инкременты online_games/online_wins (UPDATE ... SET x = x + n, по запросу на игрока).
+    Возвращает id созданных игр в порядке records.
+    """
+    from sqlalchemy import func, update
+    from src.database.models import MultiplayerGame, User
+    if session_factory is None:
+        from src.database.session import SessionLocal as session_factory
+
+    games = defaultdict(int)
+    wins = defaultdict(int)
+    for record in records:
+        games[record.player1_id] += 1
+        games[record.player2_id] += 1
+        if record.result == "player1":
+            wins[record.player1_id] += 1
+        elif record.result == "player2":
+            wins[record.player2_id] += 1
+
+    db = session_factory()
+    try:
+        rows = [
+            MultiplayerGame(
+                player1_id=record.player1_id,
+                player2_id=record.player2_id,
+                player1_gesture=record.player1_gesture,
+                player2_gesture=record.player2_gesture,
+                result=record.result,
+            )
+            for record in records
+        ]
+        db.add_all(rows)
+        for user_id, played in games.items():
+            db.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values(
+                    online_games=func.coalesce(User.online_games, 0) + played,
+                    online_wins=func.coalesce(User.online_wins, 0) + wins.get(user_id, 0),
+                )
+            )
+        db.commit()
+        return [row.id for row in rows]
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class ResultWriter:
+    """
+    Отложенная (write-behind) запись результатов боёв: conclude_battle кладёт результат
+    в очередь и сразу продолжает работу, а фоновая задача собирает накопившиеся
+    результаты (до max_batch, не дольше flush_interval_ms с первого) и пишет их
+    одной транзакцией в пуле потоков, не блокируя event loop. Если пачка не записалась,
+    результаты пишутся по одному, и теряется только запись, которая не проходит сама.
+    submit возвращает future с id игры – его можно дождаться, а можно и нет.
+    """
+
+    def __init__(self, max_batch: int = 64, flush_interval_ms: float = 200, session_factory=None):
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval_ms / 1000
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._task = None
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, record: MatchRecord) -> asyncio.Future:
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((record, future))
+        return future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            ids = await loop.run_in_executor(None, write_records, [record for record, _ in batch], self.session_factory)
+        except Exception as e:
+            if len(batch) > 1:
+                print(f"Failed to save {len(batch)} match results in one transaction, retrying one by one: {e}")
+                for item in batch:
+                    await self._flush([item])
+                return
+            print(f"Failed to save match result: {e}")
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+        for (_, future), game_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(game_id)
+
+    async def _run(self):
+        stopping = False
+        while not (stopping and self._queue.empty()):
+            batch = await self._collect()
+            stopping = stopping or any(item is _STOP for item in batch)
+            batch = [item for item in batch if item is not _STOP]
+            if batch:
+                await self._flush(batch)
+
+    async def close(self):
+        """Дописывает всё, что осталось в очереди, и останавливает задачу (при остановке приложения)."""
+        if self._task is None or self._task.done():
+            return
+        self._queue.put_nowait(_STOP)
+        await self._task
@@ -0,0 +1,63 @@
+"""
+Бинарный режим протокола /ws/multiplayer. Клиент предлагает подпротокол SUBPROTOCOL при
+открытии веб-сокета; если сервер его принял, все сообщения в обе стороны – бинарные:
+байт типа + тело.
+    MSG_JSON   – тело: JSON-сообщение (join, ready, battle_end, ...), как в текстовом режиме
+    MSG_FRAME  – тело: кадр камеры (байт флагов + JPEG), только от клиента
+    MSG_SIGNAL – тело: данные WebRTC signal (SDP/ICE) в JSON; бинарному сопернику сервер
+                 пересылает байты как есть, не разбирая
+    MSG_PING, MSG_PONG – сердцебиение, без тела
+Клиенты без подпротокола работают по-старому: JSON-текстом, кадры – бинарными сообщениями.
+Если игроки одного матча в разных режимах, signal бинарного клиента разбирается только
+для текстового получателя и уходит ему обычным JSON-сообщением (не JSON – не уходит вовсе),
+а signal текстового клиента бинарный получает как MSG_JSON.
+"""
+import json
+from typing import Optional, Tuple
+
+from src.multiplayer.connection import serialize
+
+SUBPROTOCOL = "rps.binary.v1"
+
+MSG_JSON = 0
+MSG_FRAME = 1
+MSG_SIGNAL = 2
+MSG_PING = 3
+MSG_PONG = 4
+
+PING_TEXT = serialize({"action": "ping"})
+
+
+def split(message: dict) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    Сообщение хаба -> (text, raw). Непрозрачный signal от бинарного клиента ({"action": "signal",
+    "raw": байты}) остаётся байтами raw, остальное сериализуется в text один раз на всех получателей.
+    """
+    if message.get("action") == "signal" and isinstance(message.get("raw"), bytes):
+        return None, message["raw"]
+    return serialize(message), None
+
+
+def to_text(text: Optional[str], raw: Optional[bytes]) -> str:
+    """
+    Кадр для текстового клиента. Непрозрачный signal разбирается только здесь (склейка строк
+    позволила бы подмешать в сообщение чужие поля); ValueError, если это не одно JSON-значение.
+    """
+    if raw is not None:
+        return serialize({"action": "signal", "data": json.loads(raw)})
+    return text
+
+
+def to_binary(text: Optional[str], raw: Optional[bytes]) -> bytes:
+    if raw is not None:
+        return bytes((MSG_SIGNAL,)) + raw
+    if text == PING_TEXT:
+        return bytes((MSG_PING,))
+    return bytes((MSG_JSON,)) + text.encode()
+
+
+def unpack(payload: bytes) -> Tuple[Optional[int], bytes]:
+    """Бинарное сообщение клиента -> (тип, тело); у пустого сообщения типа нет."""
+    if not payload:
+        return None, b""
+    return payload[0], payload[1:]
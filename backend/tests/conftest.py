@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+import pytest
+
+# Приложение импортируется с временной SQLite-базой, а не с src/database/test.db
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="rps-tests-"), "test.db"))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from src.main import app
+
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,66 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from src.api.model_inference import ArchiveTooLargeError, open_archive
+from src.config import settings
+
+
+def zip_with(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def tar_with(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.mark.parametrize("pack", [zip_with, tar_with])
+def test_zip_bomb_member_is_rejected_before_reading(pack, monkeypatch):
+    monkeypatch.setattr(settings, "INFERENCE_BULK_MAX_FILE_MB", 1)
+    bomb = pack([("bomb.jpg", b"\0" * (2 * 1024 * 1024))])
+    with pytest.raises(ArchiveTooLargeError):
+        open_archive(bomb)
+
+
+@pytest.mark.parametrize("pack", [zip_with, tar_with])
+def test_archive_limits_on_total_size_and_file_count(pack, monkeypatch):
+    monkeypatch.setattr(settings, "INFERENCE_BULK_MAX_FILES", 3)
+    with pytest.raises(ArchiveTooLargeError):
+        open_archive(pack([(f"{i}.jpg", b"x") for i in range(4)]))
+    monkeypatch.setattr(settings, "INFERENCE_BULK_MAX_TOTAL_MB", 1)
+    with pytest.raises(ArchiveTooLargeError):
+        open_archive(pack([(f"{i}.jpg", b"\0" * (600 * 1024)) for i in range(2)]))
+
+
+@pytest.mark.parametrize("pack", [zip_with, tar_with])
+def test_archive_within_limits_yields_images(pack):
+    items = list(open_archive(pack([("a.jpg", b"1"), ("notes.txt", b"-"), ("b.png", b"2")])))
+    assert items == [("a.jpg", b"1"), ("b.png", b"2")]
+
+
+def test_bulk_endpoint_answers_413(client, monkeypatch):
+    from src.api.user import get_current_user
+    from src.inference import service
+
+    monkeypatch.setattr(settings, "INFERENCE_BULK_MAX_FILES", 1)
+    monkeypatch.setitem(service.readiness, "ready", True)
+    client.app.dependency_overrides[get_current_user] = lambda: None
+    try:
+        response = client.post("/model/detect/bulk", files={"archive": ("a.zip", zip_with([("a.jpg", b"1"), ("b.jpg", b"2")]))})
+    finally:
+        client.app.dependency_overrides.clear()
+    assert response.status_code == 413
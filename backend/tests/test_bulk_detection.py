@@ -0,0 +1,40 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.config import settings
+from src.inference import service
+
+
+def test_bulk_frames_are_capped_and_yield_to_a_busy_queue(monkeypatch):
+    busy = SimpleNamespace(load=1.0)
+    inflight, peak, submitted = [0], [0], []
+
+    async def detect_bytes(data):
+        submitted.append(data)
+        inflight[0] += 1
+        peak[0] = max(peak[0], inflight[0])
+        await asyncio.sleep(0.01)
+        inflight[0] -= 1
+        return {"detections": []}
+
+    async def images():
+        for i in range(6):
+            yield f"{i}.jpg", bytes((i,))
+
+    async def scenario():
+        monkeypatch.setattr(service, "bulk_slots", asyncio.Semaphore(2))
+        stream = service.detect_many(images(), 6)
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        # Пока обычная полоса загружена живыми игроками, пакет в очередь не идёт
+        assert submitted == []
+        busy.load = 0.0
+        return [await first] + [item async for item in stream]
+
+    monkeypatch.setattr(service, "client", None)
+    monkeypatch.setattr(service, "batcher", busy)
+    monkeypatch.setattr(service, "detect_bytes", detect_bytes)
+    monkeypatch.setattr(settings, "INFERENCE_BULK_QUEUE_SHARE", 0.25)
+    results = asyncio.run(scenario())
+    assert [r["index"] for r in results] == list(range(6))
+    assert peak[0] == 2
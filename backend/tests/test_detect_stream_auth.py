@@ -0,0 +1,11 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+
+@pytest.mark.parametrize("first_message", ["[]", '"x"', "42", "null", "{", '{"action": "auth"}'])
+def test_malformed_auth_message_closes_with_1008(client, first_message):
+    with client.websocket_connect("/ws/detect") as ws:
+        ws.send_text(first_message)
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+        assert closed.value.code == 1008
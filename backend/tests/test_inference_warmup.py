@@ -0,0 +1,44 @@
+import asyncio
+
+from src.api import health
+from src.config import settings
+from src.inference import service
+
+
+def test_warmup_retries_on_a_fresh_pool_then_fails_liveness(monkeypatch):
+    attempts = []
+
+    async def failing_warmup():
+        attempts.append(1)
+        raise RuntimeError("A thread initializer failed")
+
+    monkeypatch.setattr(service.pool, "warmup", failing_warmup)
+    monkeypatch.setattr(service.pool, "shutdown", lambda: attempts.append("shutdown"))
+    monkeypatch.setattr(settings, "INFERENCE_WARMUP_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "INFERENCE_WARMUP_BACKOFF_S", 0.01)
+    monkeypatch.setattr(service, "readiness", {"ready": False, "error": None, "load_seconds": None,
+                                                 "attempts": 0, "fatal": False})
+
+    asyncio.run(service.start_local())
+    assert attempts == [1, "shutdown"] * 3
+    assert service.readiness["fatal"]
+    assert health.healthz().status_code == 503
+
+
+def test_warmup_recovers_after_a_failure(monkeypatch):
+    calls = []
+
+    async def flaky_warmup():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("A thread initializer failed")
+
+    monkeypatch.setattr(service.pool, "warmup", flaky_warmup)
+    monkeypatch.setattr(service.pool, "shutdown", lambda: None)
+    monkeypatch.setattr(settings, "INFERENCE_WARMUP_BACKOFF_S", 0.01)
+    monkeypatch.setattr(service, "readiness", {"ready": False, "error": None, "load_seconds": None,
+                                                 "attempts": 0, "fatal": False})
+
+    asyncio.run(service.start_local())
+    assert service.readiness["ready"] and service.readiness["error"] is None
+    assert health.healthz()["status"] == "ok"
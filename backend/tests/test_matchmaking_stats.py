@@ -0,0 +1,17 @@
+from src.api import multiplayer
+
+
+def test_stats_report_unreachable_broker_as_503(client, monkeypatch):
+    async def stats():
+        raise ConnectionError("Брокер онлайн-режима недоступен: connection refused")
+
+    monkeypatch.setattr(multiplayer.backend, "stats", stats)
+    response = client.get("/multiplayer/matchmaking/stats")
+    assert response.status_code == 503
+    assert response.json()["detail"].startswith("Брокер онлайн-режима недоступен")
+
+
+def test_stats_include_outbound_queues(client):
+    response = client.get("/multiplayer/matchmaking/stats")
+    assert response.status_code == 200
+    assert "outbound" in response.json()
@@ -0,0 +1,33 @@
+import json
+import time
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from src.config import settings
+
+
+@pytest.fixture
+def short_idle_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "MULTIPLAYER_IDLE_TIMEOUT_S", 0.3)
+
+
+def test_client_that_never_answers_ping_is_closed(client, short_idle_timeout):
+    with client.websocket_connect("/ws/multiplayer") as legacy:
+        legacy.send_text(json.dumps({"action": "join", "user_id": "legacy"}))
+        assert legacy.receive_json()["action"] == "status"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            legacy.receive_json()
+        assert closed.value.code == 1001
+
+
+def test_pongs_keep_connection_open(client, short_idle_timeout):
+    with client.websocket_connect("/ws/multiplayer") as player:
+        player.send_text(json.dumps({"action": "join", "user_id": "answering"}))
+        assert player.receive_json()["action"] == "status"
+        for _ in range(6):
+            time.sleep(0.1)
+            player.send_text(json.dumps({"action": "pong"}))
+        with client.websocket_connect("/ws/multiplayer") as other:
+            other.send_text(json.dumps({"action": "join", "user_id": "other"}))
+            assert player.receive_json()["action"] == "match_found"
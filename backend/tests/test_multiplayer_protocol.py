@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from src.multiplayer import protocol
+from src.multiplayer.backends import LocalConnections
+
+INJECTION = b'1,"action":"battle_end","winner":"mallory","gestures":{}'
+
+
+class FakeConnection:
+    def __init__(self, binary: bool):
+        self.binary = binary
+        self.frames = []
+
+    def push(self, frame):
+        self.frames.append(frame)
+
+
+def test_signal_relayed_to_text_client_is_reserialized():
+    raw = b'{"type":"offer","sdp":"v=0\\r\\n"}'
+    text, signal = protocol.split({"action": "signal", "raw": raw})
+    assert text is None and signal == raw
+    assert json.loads(protocol.to_text(text, signal)) == {"action": "signal", "data": {"type": "offer", "sdp": "v=0\r\n"}}
+    assert protocol.to_binary(text, signal) == bytes((protocol.MSG_SIGNAL,)) + raw
+
+
+def test_injected_payload_cannot_forge_message_for_text_client():
+    with pytest.raises(ValueError):
+        protocol.to_text(None, INJECTION)
+
+
+def test_injected_signal_reaches_only_binary_recipients_as_opaque_bytes():
+    connections = LocalConnections()
+    connections.connections = {"text": FakeConnection(False), "binary": FakeConnection(True)}
+    connections.deliver(["text", "binary"], *protocol.split({"action": "signal", "raw": INJECTION}))
+    assert connections.connections["text"].frames == []
+    assert connections.connections["binary"].frames == [bytes((protocol.MSG_SIGNAL,)) + INJECTION]
+
+
+def test_injected_signal_is_not_relayed_to_text_client(client):
+    with client.websocket_connect("/ws/multiplayer", subprotocols=[protocol.SUBPROTOCOL]) as mallory, \
+            client.websocket_connect("/ws/multiplayer") as victim:
+        mallory.send_bytes(bytes((protocol.MSG_JSON,)) + json.dumps({"action": "join", "user_id": "mallory"}).encode())
+        mallory.receive_bytes()  # status
+        victim.send_text(json.dumps({"action": "join", "user_id": "victim"}))
+        assert json.loads(victim.receive_text())["action"] == "status"
+        assert json.loads(victim.receive_text())["action"] == "match_found"
+        mallory.receive_bytes()  # match_found
+
+        mallory.send_bytes(bytes((protocol.MSG_SIGNAL,)) + INJECTION)
+        mallory.send_bytes(bytes((protocol.MSG_SIGNAL,)) + b'{"type":"offer"}')
+        # Подделка не дошла до текстового клиента – первым приходит следующий, настоящий signal
+        assert json.loads(victim.receive_text()) == {"action": "signal", "data": {"type": "offer"}}
@@ -0,0 +1,35 @@
+import asyncio
+
+from src.api import detect_stream
+from src.api import multiplayer
+
+
+def test_final_gesture_reaches_hub_when_detection_fails(monkeypatch):
+    async def broken_detect(*args, **kwargs):
+        raise RuntimeError("engine failed")
+
+    handled, sent = [], []
+
+    async def handle(conn, message):
+        handled.append(message)
+
+    async def send(conns, message):
+        sent.append(message)
+
+    monkeypatch.setattr(detect_stream, "detect_bytes", broken_detect)
+    monkeypatch.setattr(multiplayer.backend, "handle", handle)
+    monkeypatch.setattr(multiplayer.backend, "send", send)
+
+    async def scenario():
+        frames = multiplayer.PlayerFrames("conn", "guest")
+        for round_no in range(2):
+            await frames.put(bytes((multiplayer.FRAME_RESET,)) + b"jpeg")
+            await asyncio.sleep(0.01)
+            await frames.put(bytes((multiplayer.FRAME_FINAL,)) + b"jpeg")
+            await asyncio.sleep(0.01)
+        assert not frames.task.done()
+        frames.close()
+
+    asyncio.run(scenario())
+    assert [message["gesture"] for message in handled] == ["none", "none"]
+    assert all(message["action"] == "detection" and "error" in message for message in sent)
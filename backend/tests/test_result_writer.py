@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from src.database.base import Base
+from src.database import models
+from src.database.session import build_engine
+from src.multiplayer.hub import clean_gesture
+from src.multiplayer.persistence import MatchRecord, ResultWriter
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'results.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add_all([models.User(id=user_id, username=f"u{user_id}", password_hash="-") for user_id in (1, 2)])
+        db.commit()
+    yield factory
+    engine.dispose()
+
+
+def test_bad_record_does_not_lose_the_batch(session_factory):
+    async def scenario():
+        writer = ResultWriter(max_batch=8, flush_interval_ms=50, session_factory=session_factory)
+        good = [writer.submit(MatchRecord(1, 2, "rock", "paper", "player2")) for _ in range(3)]
+        bad = writer.submit(MatchRecord(1, 2, None, "paper", "player2"))  # NOT NULL
+        results = await asyncio.gather(*good, bad, return_exceptions=True)
+        await writer.close()
+        return results
+
+    *good_ids, bad_result = asyncio.run(scenario())
+    assert all(isinstance(game_id, int) for game_id in good_ids)
+    assert isinstance(bad_result, Exception)
+    with session_factory() as db:
+        assert db.query(models.MultiplayerGame).count() == 3
+        assert db.get(models.User, 2).online_wins == 3
+
+
+def test_client_gestures_are_validated():
+    assert clean_gesture(" Rock ") == "Rock"
+    assert clean_gesture("x" * 100) == "none"
+    assert clean_gesture({"gesture": "rock"}) == "none"
@@ -0,0 +1,18 @@
+import asyncio
+
+import pytest
+
+from src.inference import protocol
+from src.inference.client import SidecarClient
+from src.inference.errors import InvalidImageError
+
+
+def test_oversized_payload_is_rejected_without_touching_the_connection():
+    client = SidecarClient("/nonexistent/sidecar.sock")
+
+    async def connect():
+        raise AssertionError("соединение с сайдкаром не должно открываться")
+
+    client._connect = connect
+    with pytest.raises(InvalidImageError):
+        asyncio.run(client.detect(b"\0" * (protocol.MAX_PAYLOAD + 1)))
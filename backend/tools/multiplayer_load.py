@@ -0,0 +1,353 @@
+"""
+Нагрузочный тест онлайн-режима: тысячи клиентов /ws/multiplayer по настоящему протоколу
+(join -> match_found -> signal -> ready -> battle_start -> gesture -> battle_end -> play_again ...).
+
+С --binary клиенты согласуют бинарный протокол (src/multiplayer/protocol.py): signal
+уходит непрозрачными байтами, остальное – JSON с байтом типа.
+
+Без --url скрипт сам поднимает uvicorn на временной SQLite-базе с заранее созданными
+игроками (результаты боёв пишутся в неё же) и удаляет её после прогона.
+Жесты клиенты присылают текстом (как старые клиенты), так что модель для теста не нужна.
+
+Отчёт: время до матча, задержка пересылки signal, расхождение battle_start и battle_end
+у двух игроков одного боя, пропускная способность по сообщениям, задержка event loop
+сервера (из /healthz) и самого генератора – чтобы убедиться, что узкое место не в нём.
+
+Пример (из каталога backend):
+    python tools/multiplayer_load.py --clients 2000 --rounds 3 --output load.json
+    python tools/multiplayer_load.py --url http://127.0.0.1:8000 --clients 500 --binary
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from src.multiplayer import protocol
+
+GESTURES = ("Rock", "Paper", "Scissors")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize_ms(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p95": round(percentile(values, 95) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "max": round(max(values) * 1000, 2),
+    }
+
+
+class Metrics:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.completed = 0
+        self.time_to_match = []
+        self.signal_latency = []
+        self.battles = defaultdict(dict)  # (match_id, раунд) -> {user_id: (battle_start, battle_end)}
+        self.errors = defaultdict(int)
+
+    def skews(self):
+        start_skew, end_skew = [], []
+        for players in self.battles.values():
+            if len(players) == 2:
+                (start1, end1), (start2, end2) = players.values()
+                start_skew.append(abs(start1 - start2))
+                end_skew.append(abs(end1 - end2))
+        return start_skew, end_skew
+
+
+def decode(raw) -> dict:
+    if isinstance(raw, str):
+        return json.loads(raw)
+    kind, body = protocol.unpack(raw)
+    if kind == protocol.MSG_PING:
+        return {"action": "ping"}
+    if kind == protocol.MSG_SIGNAL:
+        return {"action": "signal", "data": json.loads(body)}
+    return json.loads(body)
+
+
+async def run_client(user_id, ws_url: str, args, metrics: Metrics, delay: float):
+    from websockets.asyncio.client import connect
+
+    await asyncio.sleep(delay)
+    gesture_task = None
+    try:
+        subprotocols = [protocol.SUBPROTOCOL] if args.binary else None
+        async with connect(ws_url, open_timeout=args.connect_timeout, ping_interval=None, max_size=None,
+                           subprotocols=subprotocols) as ws:
+            binary = ws.subprotocol == protocol.SUBPROTOCOL
+
+            async def send(message):
+                metrics.sent += 1
+                if not binary:
+                    await ws.send(json.dumps(message))
+                elif message["action"] == "signal":
+                    await ws.send(bytes((protocol.MSG_SIGNAL,)) + json.dumps(message["data"]).encode())
+                elif message["action"] == "pong":
+                    await ws.send(bytes((protocol.MSG_PONG,)))
+                else:
+                    await ws.send(bytes((protocol.MSG_JSON,)) + json.dumps(message).encode())
+
+            async def send_gesture():
+                # Игрок "думает" перед финальным жестом, как живой
+                await asyncio.sleep(args.think_time * random.uniform(0.5, 1.5))
+                await send({"action": "gesture", "gesture": random.choice(GESTURES)})
+
+            joined = time.perf_counter()
+            await send({"action": "join", "user_id": user_id})
+            match_id, round_no, started = None, 0, None
+            async for raw in ws:
+                now = time.perf_counter()
+                metrics.received += 1
+                message = decode(raw)
+                action = message.get("action")
+                if action == "ping":
+                    await send({"action": "pong"})
+                elif action == "match_found":
+                    metrics.time_to_match.append(now - joined)
+                    match_id = message["match_id"]
+                    if message["players"][0] == user_id:
+                        # Инициатор WebRTC шлёт offer, сервер пересылает его сопернику
+                        await send({"action": "signal", "data": {"type": "offer", "sent": time.perf_counter()}})
+                    await send({"action": "ready"})
+                elif action == "signal":
+                    metrics.signal_latency.append(now - message["data"]["sent"])
+                elif action == "battle_start":
+                    started = now
+                    gesture_task = asyncio.create_task(send_gesture())
+                elif action == "battle_end":
+                    metrics.battles[(match_id, round_no)][user_id] = (started, now)
+                    round_no += 1
+                    if round_no >= args.rounds:
+                        metrics.completed += 1
+                        break
+                    await send({"action": "play_again"})
+                elif action == "replay":
+                    await send({"action": "ready"})
+                elif action in ("disconnect", "error"):
+                    metrics.errors[action] += 1
+                    break
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        metrics.errors[type(e).__name__] += 1
+    finally:
+        if gesture_task is not None:
+            gesture_task.cancel()
+
+
+async def sample_loop_lag(lags: list, interval: float = 0.05):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - started - interval))
+
+
+def fetch_json(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        # /healthz отвечает 503 с тем же отчётом, если модель так и не загрузилась
+        try:
+            return json.loads(e.read())
+        except ValueError:
+            return {"error": str(e)}
+    except OSError as e:
+        return {"error": str(e)}
+
+
+async def poll_server_lag(http_url: str, reports: list, interval: float = 10):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        health = await loop.run_in_executor(None, fetch_json, f"{http_url}/healthz")
+        if "loop_lag" in health:
+            reports.append(health["loop_lag"])
+
+
+async def run_load(http_url: str, user_ids, args) -> dict:
+    ws_url = http_url.replace("http", "ws", 1) + "/ws/multiplayer"
+    metrics = Metrics()
+    client_lags, server_lags = [], []
+    monitors = [
+        asyncio.create_task(sample_loop_lag(client_lags)),
+        asyncio.create_task(poll_server_lag(http_url, server_lags)),
+    ]
+    started = time.perf_counter()
+    clients = [
+        asyncio.create_task(run_client(user_id, ws_url, args, metrics, index * args.ramp / len(user_ids)))
+        for index, user_id in enumerate(user_ids)
+    ]
+    _, pending = await asyncio.wait(clients, timeout=args.time_limit)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    for task in monitors:
+        task.cancel()
+
+    loop = asyncio.get_running_loop()
+    health = await loop.run_in_executor(None, fetch_json, f"{http_url}/healthz")
+    server_stats = await loop.run_in_executor(None, fetch_json, f"{http_url}/multiplayer/matchmaking/stats")
+    start_skew, end_skew = metrics.skews()
+    return {
+        "clients": len(user_ids),
+        "rounds": args.rounds,
+        "binary": args.binary,
+        "completed_clients": metrics.completed,
+        "timed_out_clients": len(pending),
+        "errors": dict(metrics.errors),
+        "elapsed_s": round(elapsed, 2),
+        "battles": len(start_skew),
+        "battles_per_second": round(len(start_skew) / elapsed, 2),
+        "time_to_match_ms": summarize_ms(metrics.time_to_match),
+        "signal_relay_ms": summarize_ms(metrics.signal_latency),
+        "battle_start_skew_ms": summarize_ms(start_skew),
+        "battle_end_skew_ms": summarize_ms(end_skew),
+        "messages": {
+            "sent": metrics.sent,
+            "received": metrics.received,
+            "per_second": round((metrics.sent + metrics.received) / elapsed, 1),
+        },
+        "server_loop_lag": health.get("loop_lag"),
+        "server_loop_lag_worst_p99_ms": max((report.get("p99_ms", 0) for report in server_lags), default=None),
+        "client_loop_lag_ms": summarize_ms(client_lags),
+        "server_stats": server_stats,
+    }
+
+
+def seed_users(database_url: str, count: int):
+    """Создаёт таблицы и count игроков во временной базе (id 1..count)."""
+    from sqlalchemy import create_engine, insert
+    from src.database.base import Base
+    from src.database import models
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(models.User), [
+            {"id": user_id, "username": f"load{user_id}", "password_hash": "-"} for user_id in range(1, count + 1)
+        ])
+    engine.dispose()
+
+
+def start_server(port: int, database_url: str):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    http_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {process.returncode}")
+        if "error" not in fetch_json(f"{http_url}/healthz"):
+            return process, http_url
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Сервер не ответил на /healthz за 60 с")
+
+
+def raise_fd_limit(clients: int):
+    # Каждому клиенту нужен сокет, а своему серверу – ещё один на его стороне
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, max(soft, clients * 2 + 256))
+    if wanted > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+def print_report(report: dict):
+    def line(title, summary):
+        if summary.get("count"):
+            print(f"{title}: p50 {summary['p50']} мс, p95 {summary['p95']} мс, p99 {summary['p99']} мс, "
+                  f"max {summary['max']} мс (n={summary['count']})")
+
+    print(f"Клиентов: {report['clients']}, завершили: {report['completed_clients']}, "
+          f"не успели: {report['timed_out_clients']}, ошибки: {report['errors'] or 'нет'}")
+    print(f"Боёв: {report['battles']} за {report['elapsed_s']} с ({report['battles_per_second']} в секунду)")
+    line("Время до матча", report["time_to_match_ms"])
+    line("Пересылка signal", report["signal_relay_ms"])
+    line("Расхождение battle_start", report["battle_start_skew_ms"])
+    line("Расхождение battle_end", report["battle_end_skew_ms"])
+    messages = report["messages"]
+    print(f"Сообщений: отправлено {messages['sent']}, получено {messages['received']}, {messages['per_second']} в секунду")
+    lag = report["server_loop_lag"] or {}
+    if lag.get("samples"):
+        print(f"Задержка event loop сервера (последние {lag['window_s']} с): p50 {lag['p50_ms']} мс, "
+              f"p99 {lag['p99_ms']} мс, max {lag['max_ms']} мс")
+    line("Задержка event loop генератора", report["client_loop_lag_ms"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест /ws/multiplayer")
+    parser.add_argument("--url", help="адрес уже запущенного сервера (http://host:port); без него поднимается свой")
+    parser.add_argument("--port", type=int, default=8765, help="порт своего сервера")
+    parser.add_argument("--clients", type=int, default=200, help="число клиентов (лучше чётное)")
+    parser.add_argument("--rounds", type=int, default=3, help="боёв на пару (play_again между ними)")
+    parser.add_argument("--think-time", type=float, default=1.0, help="средняя пауза до жеста после battle_start, с")
+    parser.add_argument("--ramp", type=float, default=5.0, help="за сколько секунд подключить всех клиентов")
+    parser.add_argument("--connect-timeout", type=float, default=30.0)
+    parser.add_argument("--time-limit", type=float, default=300.0, help="максимальная длительность прогона, с")
+    parser.add_argument("--binary", action="store_true", help="бинарный протокол вместо JSON-текста")
+    parser.add_argument("--output", help="куда записать отчёт в JSON")
+    args = parser.parse_args()
+
+    raise_fd_limit(args.clients)
+    server = None
+    database_dir = None
+    try:
+        if args.url:
+            # На чужом сервере игроки не из базы: строковые id, результаты боёв в БД не пишутся
+            http_url = args.url.rstrip("/")
+            user_ids = [f"load-{index}" for index in range(args.clients)]
+        else:
+            database_dir = tempfile.mkdtemp(prefix="rps-load-")
+            database_url = f"sqlite:///{os.path.join(database_dir, 'load.db')}"
+            seed_users(database_url, args.clients)
+            server, http_url = start_server(args.port, database_url)
+            user_ids = [str(user_id) for user_id in range(1, args.clients + 1)]
+        report = asyncio.run(run_load(http_url, user_ids, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if database_dir is not None:
+            shutil.rmtree(database_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
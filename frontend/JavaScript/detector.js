@@ -0,0 +1,114 @@
+// Клиент потоковой детекции жестов через /ws/detect.
+// Соединение авторизуется один раз, дальше кадры уходят бинарными сообщениями.
+// Сервер обрабатывает только самый свежий кадр, поэтому ответ на новый кадр
+// закрывает и все более старые ожидающие запросы.
+// Если websocket недоступен, используется обычный POST /model/detect.
+// reset() помечает следующий кадр как первый кадр нового раунда – сервер
+// сбрасывает историю сглаживания жеста (smoothed_gesture / stable).
+// detect(blob, { priority: true }) – решающий кадр (результат раунда), сервер
+// обрабатывает его вне очереди. scanInterval() – рекомендуемый сервером интервал
+// между фоновыми кадрами (растёт под нагрузкой).
+function createGestureDetector(backendUrl, token) {
+  const wsUrl = (window.location.protocol === 'https:' ? 'wss://' : 'ws://') + window.location.host + '/ws/detect';
+  let socket = null;
+  let ready = null;
+  let sentFrames = 0;
+  let pending = []; // [{ frame, resolve, reject }]
+  let resetPending = false;
+  let serverScanInterval = null;
+
+  function scanInterval(fallback = 2000) {
+    return serverScanInterval || fallback;
+  }
+
+  function rememberScanInterval(msg) {
+    if (msg && msg.scan_interval_ms) serverScanInterval = msg.scan_interval_ms;
+  }
+
+  function reset() {
+    resetPending = true;
+  }
+
+  function rejectPending(reason) {
+    pending.forEach(p => p.reject(reason));
+    pending = [];
+  }
+
+  function connect() {
+    if (ready) return ready;
+    ready = new Promise((resolve, reject) => {
+      socket = new WebSocket(wsUrl);
+      socket.binaryType = 'arraybuffer';
+      socket.onopen = () => {
+        sentFrames = 0;
+        socket.send(JSON.stringify({ action: "auth", token }));
+      };
+      socket.onmessage = (event) => {
+        const msg = JSON.parse(event.data);
+        if (msg.action === "auth_ok") {
+          resolve(socket);
+          return;
+        }
+        rememberScanInterval(msg);
+        const done = pending.filter(p => p.frame <= msg.frame);
+        pending = pending.filter(p => p.frame > msg.frame);
+        done.forEach(p => msg.error ? p.reject(msg.error) : p.resolve(msg));
+      };
+      socket.onclose = () => {
+        reject("Соединение детекции закрыто");
+        rejectPending("Соединение детекции закрыто");
+        ready = null;
+      };
+      socket.onerror = (err) => { console.error("Ошибка WebSocket детекции:", err); };
+    });
+    return ready;
+  }
+
+  async function detectHttp(blob, priority) {
+    const formData = new FormData();
+    formData.append('file', blob, 'frame.jpg');
+    if (priority) formData.append('priority', 'true');
+    if (resetPending) {
+      formData.append('reset', 'true');
+      resetPending = false;
+    }
+    const response = await fetch(`${backendUrl}/model/detect`, {
+      method: 'POST',
+      headers: { 'Authorization': `Bearer ${token}` },
+      body: formData
+    });
+    if (response.status === 429) {
+      // Очередь сервера переполнена – следующий фоновый кадр не раньше Retry-After
+      const retryAfter = Number(response.headers.get('Retry-After')) || 5;
+      serverScanInterval = Math.max(scanInterval(), retryAfter * 1000);
+    }
+    if (!response.ok) {
+      throw new Error(`Ошибка детекции: ${response.status}`);
+    }
+    const data = await response.json();
+    rememberScanInterval(data);
+    return data;
+  }
+
+  async function detect(blob, { priority = false } = {}) {
+    let ws;
+    try {
+      ws = await connect();
+    } catch (err) {
+      return detectHttp(blob, priority);
+    }
+    const buffer = await blob.arrayBuffer();
+    if (resetPending) {
+      ws.send(JSON.stringify({ action: "reset" }));
+      resetPending = false;
+    }
+    if (priority) ws.send(JSON.stringify({ action: "priority" }));
+    return new Promise((resolve, reject) => {
+      sentFrames++;
+      pending.push({ frame: sentFrames, resolve, reject });
+      ws.send(buffer);
+    });
+  }
+
+  return { detect, reset, scanInterval };
+}
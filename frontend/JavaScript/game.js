@@ -40,9 +40,12 @@ navigator.mediaDevices.getUserMedia({ video: true })
     alert("Невозможно получить доступ к камере.");
   });
 
+// Детекция идёт через постоянное websocket-соединение /ws/detect (см. detector.js)
+const gestureDetector = createGestureDetector(backendUrl, token);
+
 // Функция для захвата кадра и отправки его на сервер для детекции
 // Ожидаем, что сервер вернет объект вида: { gesture: "Rock", bbox: [x1, y1, x2, y2] }
-async function detectGesture() {
+async function detectGesture(priority = false) {
   captureCtx.drawImage(video, 0, 0, captureCanvas.width, captureCanvas.height);
 
   return new Promise((resolve, reject) => {
@@ -51,22 +54,8 @@ async function detectGesture() {
         reject("Ошибка преобразования кадра в Blob");
         return;
       }
-      const formData = new FormData();
-      formData.append('file', blob, 'frame.jpg');
-
       try {
-        const response = await fetch(`${backendUrl}/model/detect`, {
-          method: 'POST',
-          headers: {
-            'Authorization': `Bearer ${token}`
-          },
-          body: formData
-        });
-
-        if (!response.ok) {
-          throw new Error(`Ошибка детекции: ${response.status}`);
-        }
-        const data = await response.json();
+        const data = await gestureDetector.detect(blob, { priority });
         // data: { gesture: "Rock", bbox: [x1, y1, x2, y2] }
         resolve(data);
       } catch (error) {
@@ -175,11 +164,23 @@ function startGame() {
   computerImg.src = '/images/placeholder.png';
 
   let finalUserGesture = null;
+  let gestureLocked = false; // сервер зафиксировал жест – новые кадры не нужны
+  let lastScanAt = 0;
+  gestureDetector.reset();
   const countdownInterval = setInterval(async () => {
     try {
-      const detection = await detectGesture();
-      finalUserGesture = detection.gesture;
-      drawOverlay(detection.bbox);
+      // Кадр последней секунды решает раунд и идёт вне очереди; промежуточные кадры
+      // под нагрузкой пропускаются, пока не выйдет интервал, предложенный сервером
+      const isFinal = countdown === 1;
+      const scanDue = Date.now() - lastScanAt >= gestureDetector.scanInterval(1000);
+      if (!gestureLocked && (isFinal || scanDue)) {
+        lastScanAt = Date.now();
+        const detection = await detectGesture(isFinal);
+        const hasSmoothed = detection.smoothed_gesture && detection.smoothed_gesture !== "No detection";
+        finalUserGesture = hasSmoothed ? detection.smoothed_gesture : detection.gesture;
+        gestureLocked = Boolean(detection.stable);
+        drawOverlay(detection.bbox);
+      }
       countdown--;
       updateTimer(countdown);
       if (countdown <= 0) {
@@ -31,14 +31,65 @@ let battleCountdownInterval;
 let gestureScanInterval;
 let battleDuration = 10; // секунд
 let battleTimer = battleDuration;
-let finalGesture = "none"; // итоговый жест
-let lastValidGesture = "none"; // сохраняет последний корректный жест
+let scanning = false; // идут ли фоновые кадры в этом раунде
+let roundStart = false; // следующий кадр – первый в раунде
+let gestureLocked = false; // сервер признал жест стабильным – кадры в этом раунде больше не нужны
+let scanInterval = 2000; // интервал фоновых кадров, мс; подсказывает сервер (под нагрузкой растёт)
 let currentMatchPlayers = [];
 let latestBattleEnd = null; // для хранения последнего сообщения battle_end
 
-const backendUrl = window.location.origin;
 const wsUrl = (window.location.protocol === 'https:' ? 'wss://' : 'ws://') + window.location.host + '/ws/multiplayer';
 
+// Кадры камеры уходят по сокету матча бинарными сообщениями: байт флагов + JPEG.
+// Жест распознаёт сервер: на фоновые кадры он отвечает "detection" (рамка, стабильность),
+// а в конце боя присылает "capture" – тогда отправляется финальный кадр.
+const FRAME_FINAL = 1;
+const FRAME_RESET = 2;
+
+// Бинарный протокол (backend/src/multiplayer/protocol.py): каждое сообщение – байт типа + тело.
+// signal уходит сопернику непрозрачными байтами, сервер его не разбирает.
+// Если сервер подпротокол не принял, всё работает по-старому, JSON-текстом.
+const PROTOCOL = "rps.binary.v1";
+const MSG_JSON = 0;
+const MSG_FRAME = 1;
+const MSG_SIGNAL = 2;
+const MSG_PING = 3;
+const MSG_PONG = 4;
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+function binaryMode() {
+  return ws.protocol === PROTOCOL;
+}
+
+function packMessage(type, body = new Uint8Array(0)) {
+  const message = new Uint8Array(body.length + 1);
+  message[0] = type;
+  message.set(body, 1);
+  return message;
+}
+
+function sendMessage(msg) {
+  if (!binaryMode()) {
+    ws.send(JSON.stringify(msg));
+  } else if (msg.action === "signal") {
+    ws.send(packMessage(MSG_SIGNAL, textEncoder.encode(JSON.stringify(msg.data))));
+  } else if (msg.action === "pong") {
+    ws.send(packMessage(MSG_PONG));
+  } else {
+    ws.send(packMessage(MSG_JSON, textEncoder.encode(JSON.stringify(msg))));
+  }
+}
+
+function decodeMessage(data) {
+  if (typeof data === "string") return JSON.parse(data);
+  const bytes = new Uint8Array(data);
+  const body = textDecoder.decode(bytes.subarray(1));
+  if (bytes[0] === MSG_PING) return { action: "ping" };
+  if (bytes[0] === MSG_SIGNAL) return { action: "signal", data: JSON.parse(body) };
+  return JSON.parse(body);
+}
+
 function updateOverlayCanvas() {
   const rect = localVideo.getBoundingClientRect();
   overlayCanvas.style.left = rect.left + "px";
@@ -49,37 +100,44 @@ function updateOverlayCanvas() {
 window.addEventListener('resize', updateOverlayCanvas);
 localVideo.addEventListener('loadedmetadata', updateOverlayCanvas);
 
-async function detectGesture() {
+function captureFrame() {
   return new Promise((resolve, reject) => {
-    try {
-      const tempCanvas = document.createElement('canvas');
-      const width = localVideo.videoWidth || 640;
-      const height = localVideo.videoHeight || 480;
-      tempCanvas.width = width;
-      tempCanvas.height = height;
-      const tempCtx = tempCanvas.getContext('2d');
-      tempCtx.drawImage(localVideo, 0, 0, width, height);
-      tempCanvas.toBlob(async (blob) => {
-        if (!blob) return reject("Ошибка преобразования кадра в Blob");
-        const formData = new FormData();
-        formData.append('file', blob, 'frame.jpg');
-        try {
-          const response = await fetch(`${backendUrl}/model/detect`, {
-            method: 'POST',
-            headers: { 'Authorization': `Bearer ${token}` },
-            body: formData
-          });
-          if (!response.ok) return reject(`Ошибка детекции: ${response.status}`);
-          const data = await response.json();
-          let detected = data.gesture === "No detection" ? "none" : data.gesture;
-          if (detected !== "none") lastValidGesture = detected;
-          resolve({ gesture: detected, bbox: data.bbox });
-        } catch (err) { reject(err); }
-      }, 'image/jpeg');
-    } catch (e) { reject(e); }
+    const tempCanvas = document.createElement('canvas');
+    tempCanvas.width = localVideo.videoWidth || 640;
+    tempCanvas.height = localVideo.videoHeight || 480;
+    tempCanvas.getContext('2d').drawImage(localVideo, 0, 0, tempCanvas.width, tempCanvas.height);
+    tempCanvas.toBlob(blob => blob ? resolve(blob) : reject("Ошибка преобразования кадра в Blob"), 'image/jpeg');
+  });
+}
+
+// withImage = false – только флаги: жест уже зафиксирован, серверу нужен лишь сигнал конца раунда
+async function sendFrame(flags, withImage = true) {
+  const image = withImage ? new Uint8Array(await (await captureFrame()).arrayBuffer()) : new Uint8Array(0);
+  if (!ws || ws.readyState !== WebSocket.OPEN) return;
+  const frame = packMessage(flags | (roundStart ? FRAME_RESET : 0), image);
+  ws.send(binaryMode() ? packMessage(MSG_FRAME, frame) : frame);
+  roundStart = false;
+}
+
+function scheduleScan(delay = scanInterval) {
+  clearTimeout(gestureScanInterval);
+  if (scanning) gestureScanInterval = setTimeout(scanGesture, delay);
+}
+
+// Следующий фоновый кадр отправляется после ответа на предыдущий (см. "detection")
+function scanGesture() {
+  if (!scanning) return;
+  sendFrame(0).catch(err => {
+    console.error("Ошибка отправки кадра:", err);
+    scheduleScan();
   });
 }
 
+function stopScanning() {
+  scanning = false;
+  clearTimeout(gestureScanInterval);
+}
+
 function drawBoundingBox(bbox) {
   updateOverlayCanvas();
   overlayCtx.clearRect(0, 0, overlayCanvas.width, overlayCanvas.height);
@@ -96,15 +154,20 @@ function drawBoundingBox(bbox) {
 }
 
 function connectWebSocket() {
-  ws = new WebSocket(wsUrl);
+  ws = new WebSocket(wsUrl, [PROTOCOL]);
+  ws.binaryType = "arraybuffer";
   ws.onopen = () => {
     statusDiv.innerText = "Подключено к серверу. Ожидание очереди...";
-    ws.send(JSON.stringify({ action: "join", user_id }));
+    sendMessage({ action: "join", user_id });
   };
   ws.onmessage = (event) => {
-    const msg = JSON.parse(event.data);
-    console.log("Получено:", msg);
+    const msg = decodeMessage(event.data);
+    if (msg.action !== "ping") console.log("Получено:", msg);
     switch (msg.action) {
+      case "ping":
+        // Сердцебиение: без ответа сервер сочтёт соединение оборванным
+        sendMessage({ action: "pong" });
+        break;
       case "status":
         statusDiv.innerText = msg.message;
         break;
@@ -122,6 +185,30 @@ function connectWebSocket() {
         battleDuration = msg.duration;
         startBattle();
         break;
+      case "detection":
+        if (msg.scan_interval_ms) scanInterval = msg.scan_interval_ms;
+        if (msg.error) {
+          console.error("Ошибка детекции:", msg.error);
+          scheduleScan(Math.max(scanInterval, (msg.retry_after || 0) * 1000));
+          break;
+        }
+        drawBoundingBox(msg.bbox);
+        if (msg.stable) {
+          // Сервер зафиксировал жест – дальше кадры в этом раунде не отправляем
+          gestureLocked = true;
+          stopScanning();
+        } else {
+          scheduleScan();
+        }
+        break;
+      case "capture":
+        // Конец боя: сервер ждёт финальный кадр и распознаёт его вне очереди
+        stopScanning();
+        sendFrame(FRAME_FINAL, !gestureLocked).catch(err => {
+          console.error("Ошибка финального кадра:", err);
+          sendFrame(FRAME_FINAL, false);
+        });
+        break;
       case "blackout":
         statusDiv.innerText = "Последние секунды битвы: экран противника затемняется.";
         blackoutOverlay.style.opacity = 1;
@@ -132,10 +219,14 @@ function connectWebSocket() {
         statusDiv.innerText = "Битва окончена!";
         resultDiv.innerText = `Победитель: ${msg.winner}\nВаш жест: ${msg.gestures[user_id]}\nЖест противника: ${getOpponentGesture(msg.gestures)}`;
         clearInterval(battleCountdownInterval);
-        clearInterval(gestureScanInterval);
+        stopScanning();
         playAgainBtn.style.display = "inline-block";
         overlayCtx.clearRect(0, 0, overlayCanvas.width, overlayCanvas.height);
         break;
+      case "battle_saved":
+        // Результат записан в БД уже после battle_end
+        if (latestBattleEnd) latestBattleEnd.game_id = msg.game_id;
+        break;
       case "player_unready":
         statusDiv.innerText = "Один из игроков отменил готовность.";
         break;
@@ -150,6 +241,11 @@ function connectWebSocket() {
       case "disconnect":
         statusDiv.innerText = msg.message;
         break;
+      case "error":
+        // Сервер отказал (например, этот пользователь уже в очереди) и закроет соединение
+        statusDiv.innerText = msg.message;
+        ws.onclose = null;
+        break;
       default:
         console.log("Неизвестное действие:", msg);
     }
@@ -171,7 +267,7 @@ function initPeerConnection(match_id) {
         stream: localStream,
         config: { iceServers: [{ urls: "stun:stun.l.google.com:19302" }] }
       });
-      peer.on('signal', data => { ws.send(JSON.stringify({ action: "signal", data })); });
+      peer.on('signal', data => { sendMessage({ action: "signal", data }); });
       peer.on('stream', stream => { remoteVideo.srcObject = stream; });
       peer.on('error', err => { console.error("Ошибка в SimplePeer:", err); });
     })
@@ -186,64 +282,33 @@ function getOpponentGesture(gestures) {
 }
 
 readyBtn.addEventListener("click", () => {
-  ws.send(JSON.stringify({ action: "ready", user_id }));
+  sendMessage({ action: "ready", user_id });
   readyBtn.disabled = true;;
 });
 
 function startBattle() {
+  gestureLocked = false;
+  roundStart = true;
   battleTimer = battleDuration;
   battleTimerDiv.innerText = `Битва: ${battleTimer} сек`;
   battleCountdownInterval = setInterval(() => {
     battleTimer--;
     battleTimerDiv.innerText = `Битва: ${battleTimer} сек`;
-    if (battleTimer <= 0) {
-      clearInterval(battleCountdownInterval);
-      clearInterval(gestureScanInterval);
-      detectGesture().then((detection) => {
-        finalGesture = (detection.gesture === "none" && lastValidGesture !== "none")
-          ? lastValidGesture
-          : detection.gesture;
-        console.log("Sending final gesture:", finalGesture);
-        ws.send(JSON.stringify({ 
-          action: "gesture", 
-          gesture: finalGesture, 
-          lastValidGesture: lastValidGesture, 
-          user_id 
-        }));
-      }).catch(err => {
-        console.error("Ошибка финальной детекции:", err);
-        console.log("Sending final gesture (with error):", finalGesture);
-        ws.send(JSON.stringify({ 
-          action: "gesture", 
-          gesture: finalGesture, 
-          lastValidGesture: lastValidGesture, 
-          user_id 
-        }));
-      });
-    }
+    if (battleTimer <= 0) clearInterval(battleCountdownInterval);
   }, 1000);
-  gestureScanInterval = setInterval(async () => {
-    try {
-      const detection = await detectGesture();
-      if (detection.gesture !== "none") lastValidGesture = detection.gesture;
-      finalGesture = detection.gesture;
-      drawBoundingBox(detection.bbox);
-      console.log("Детекция:", detection);
-    } catch (err) {
-      console.error("Ошибка детекции:", err);
-    }
-  }, 2000);
+  scanning = true;
+  scheduleScan();
 }
 
 joinQueueBtn.addEventListener("click", () => {
   if (!ws || ws.readyState !== WebSocket.OPEN) {
     connectWebSocket();
   } else {
-    ws.send(JSON.stringify({ action: "join", user_id }));
+    sendMessage({ action: "join", user_id });
   }
 });
 
 playAgainBtn.addEventListener("click", () => {
   playAgainBtn.style.display = "none";
-  ws.send(JSON.stringify({ action: "play_again", user_id }));
+  sendMessage({ action: "play_again", user_id });
 });
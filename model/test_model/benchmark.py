@@ -0,0 +1,224 @@
+"""
+Бенчмарк продакшн-пути инференса (backend/src/inference) на локальных изображениях и видео.
+
+Каждая конфигурация (движок x imgsz x размер батча x число потоков) запускается в отдельном
+процессе, чтобы пиковая память и настройки потоков не влияли друг на друга.
+Отчёт: p50/p95/p99 задержки батча, кадры в секунду, пиковый RSS и разбивка по стадиям
+decode / preprocess / inference / postprocess.
+
+Пример:
+    python model/test_model/benchmark.py --source model/test_model --backend torch onnx \
+        --batch-size 1 8 --imgsz 640 320 --threads 2 4 --output bench.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from queue import Empty
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(REPO_ROOT, "backend"))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize_ms(values):
+    return {
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p95": round(percentile(values, 95) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+        "mean": round(sum(values) / len(values) * 1000, 3),
+    }
+
+
+def peak_rss_mb():
+    if sys.platform == "win32":
+        # Модуля resource на Windows нет: пик рабочего набора отдаёт psutil, если он установлен
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    import resource
+    # ru_maxrss: килобайты на Linux, байты на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def load_samples(sources, max_frames):
+    """Собирает закодированные JPEG/PNG-кадры: файлы изображений как есть, кадры видео – перекодированными в JPEG."""
+    import cv2
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                paths.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            paths.append(source)
+
+    samples = []
+    for path in paths:
+        lower = path.lower()
+        if lower.endswith(IMAGE_EXTENSIONS):
+            with open(path, "rb") as f:
+                samples.append(f.read())
+        elif lower.endswith(VIDEO_EXTENSIONS):
+            capture = cv2.VideoCapture(path)
+            while len(samples) < max_frames:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                samples.append(cv2.imencode(".jpg", frame)[1].tobytes())
+            capture.release()
+        if len(samples) >= max_frames:
+            break
+    return samples[:max_frames]
+
+
+def run_config(config, samples, iterations, warmup, queue):
+    """Выполняется в дочернем процессе: один движок, одна конфигурация."""
+    import cv2
+    import torch
+    from src.inference.engines import create_engine
+    from src.inference.preprocess import decode_image
+
+    torch.set_num_threads(config["threads"])
+    cv2.setNumThreads(config["threads"])
+
+    engine = create_engine(config["backend"], weights_path=config["weights"], imgsz=config["imgsz"],
+                           precision=config["precision"], calibration_data=config["calibration"])
+    engine.prepare()
+    engine.load()
+    engine.warmup()
+
+    batch_size = config["batch_size"]
+    batches = [samples[i:i + batch_size] for i in range(0, len(samples), batch_size)]
+    batches = [batch for batch in batches if len(batch) == batch_size] or batches[:1]
+
+    stages = {"decode": [], "preprocess": [], "inference": [], "postprocess": []}
+    latencies = []
+    frames_done = 0
+    total_time = 0.0
+    for iteration in range(warmup + iterations):
+        for batch in batches:
+            started = time.perf_counter()
+            decoded = [decode_image(data, config["imgsz"]) for data in batch]
+            frames = [item[0] for item in decoded if item is not None]
+            t_decode = time.perf_counter()
+            tensor, params = engine.preprocess(frames)
+            t_pre = time.perf_counter()
+            results = engine.infer(tensor)
+            t_infer = time.perf_counter()
+            engine.postprocess(results, frames, params)
+            finished = time.perf_counter()
+            if iteration < warmup:
+                continue
+            stages["decode"].append(t_decode - started)
+            stages["preprocess"].append(t_pre - t_decode)
+            stages["inference"].append(t_infer - t_pre)
+            stages["postprocess"].append(finished - t_infer)
+            latencies.append(finished - started)
+            frames_done += len(frames)
+            total_time += finished - started
+
+    queue.put({
+        "config": {key: value for key, value in config.items() if key not in ("weights", "calibration")},
+        "batches": len(latencies),
+        "frames": frames_done,
+        "fps": round(frames_done / total_time, 2) if total_time else None,
+        "batch_latency_ms": summarize_ms(latencies),
+        "frame_latency_ms": round(total_time / frames_done * 1000, 3) if frames_done else None,
+        "stages_ms": {name: summarize_ms(values) for name, values in stages.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    })
+
+
+def main():
+    from src.inference.model import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Бенчмарк инференса жестов")
+    parser.add_argument("--source", nargs="+", required=True, help="каталоги/файлы с изображениями или видео")
+    parser.add_argument("--weights", default=MODEL_PATH, help="путь к best.pt")
+    parser.add_argument("--backend", nargs="+", default=["torch"], choices=["torch", "onnx", "openvino"])
+    parser.add_argument("--precision", nargs="+", default=["fp32"], choices=["fp32", "int8"])
+    parser.add_argument("--calibration", help="YAML калибровочной выборки для int8 (см. quantize.py)")
+    parser.add_argument("--batch-size", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--imgsz", nargs="+", type=int, default=[640])
+    parser.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count() or 1])
+    parser.add_argument("--max-frames", type=int, default=256)
+    parser.add_argument("--iterations", type=int, default=3, help="проходов по всем кадрам на конфигурацию")
+    parser.add_argument("--warmup", type=int, default=1, help="проходов прогрева (не учитываются)")
+    parser.add_argument("--output", help="файл для JSON-результатов")
+    args = parser.parse_args()
+
+    samples = load_samples(args.source, args.max_frames)
+    if not samples:
+        parser.error("в --source не найдено изображений или видео")
+    print(f"Кадров: {len(samples)}")
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for backend, precision, imgsz, batch_size, threads in itertools.product(
+            args.backend, args.precision, args.imgsz, args.batch_size, args.threads):
+        if precision == "int8" and backend == "torch":
+            continue
+        config = {"backend": backend, "precision": precision, "imgsz": imgsz, "batch_size": batch_size,
+                  "threads": threads, "weights": args.weights, "calibration": args.calibration}
+        queue = context.Queue()
+        process = context.Process(target=run_config, args=(config, samples, args.iterations, args.warmup, queue))
+        process.start()
+        # Результат забирается до join: иначе процесс с большим результатом ждёт, пока его
+        # прочитают из канала, а мы ждём завершения процесса
+        result = None
+        while result is None:
+            try:
+                result = queue.get(timeout=1)
+            except Empty:
+                if not process.is_alive():
+                    try:
+                        result = queue.get(timeout=1)
+                    except Empty:
+                        break
+        process.join()
+        if result is None:
+            print(f"{backend}/{precision} imgsz={imgsz} batch={batch_size} threads={threads}: ошибка (код {process.exitcode})")
+            continue
+        results.append(result)
+        stages = result["stages_ms"]
+        print(
+            f"{backend + '/' + precision:13} imgsz={imgsz:<4} batch={batch_size:<3} threads={threads:<3} "
+            f"fps={result['fps']:<8} p50={result['batch_latency_ms']['p50']}ms "
+            f"p95={result['batch_latency_ms']['p95']}ms p99={result['batch_latency_ms']['p99']}ms "
+            f"[decode {stages['decode']['p50']} / pre {stages['preprocess']['p50']} / "
+            f"infer {stages['inference']['p50']} / post {stages['postprocess']['p50']} ms] "
+            f"rss={result['peak_rss_mb']}MB"
+        )
+
+    report = {
+        "weights": os.path.abspath(args.weights),
+        "frames": len(samples),
+        "iterations": args.iterations,
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Сборка INT8-варианта детектора жестов и отчёт точность/задержка рядом с FP32.
+
+INT8-артефакты собираются тем же кодом, что и на сервере (backend/src/inference/engines.py),
+по отложенной калибровочной выборке (--calibration: YAML датасета ultralytics, split val
+которого – калибровочные кадры, не пересекающиеся с оценочными). Для каждого варианта
+считается mAP50 и mAP50-95 по классам Paper/Rock/Scissors на --data и p50/p99 задержки
+одного кадра на CPU через продакшн-путь decode -> predict.
+
+На сервере вариант включается настройками:
+    INFERENCE_BACKEND=openvino INFERENCE_PRECISION=int8 INFERENCE_CALIBRATION_DATA=<calibration.yaml>
+
+Пример:
+    python model/test_model/quantize.py --data dataset/data.yaml --calibration dataset/calibration.yaml \
+        --backend onnx openvino --output quantization.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmark import REPO_ROOT, percentile
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "backend"))
+
+
+def evaluate(engine, data_yaml, images):
+    from src.inference.model import class_names
+    from src.inference.preprocess import decode_image
+
+    metrics = engine.model.val(data=data_yaml, imgsz=engine.imgsz, batch=1, device="cpu",
+                               plots=False, verbose=False)
+    per_class = {name: {"map50": None, "map50_95": None} for name in class_names.values()}
+    for row, class_index in enumerate(metrics.box.ap_class_index):
+        ap = metrics.box.all_ap[row]
+        per_class[class_names[int(class_index)]] = {
+            "map50": round(float(ap[0]), 4),
+            "map50_95": round(float(ap.mean()), 4),
+        }
+
+    latencies = []
+    for path in images:
+        with open(path, "rb") as f:
+            data = f.read()
+        started = time.perf_counter()
+        decoded = decode_image(data, engine.imgsz)
+        if decoded is None:
+            continue
+        engine.predict([decoded[0]])
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "map50": round(float(metrics.box.map50), 4),
+        "map50_95": round(float(metrics.box.map), 4),
+        "per_class": per_class,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+        },
+    }
+
+
+def main():
+    from src.inference.engines import create_engine, val_images
+    from src.inference.model import MODEL_PATH, class_names
+
+    parser = argparse.ArgumentParser(description="INT8-квантизация детектора жестов и отчёт точность/задержка")
+    parser.add_argument("--data", required=True, help="YAML датасета для оценки (split val)")
+    parser.add_argument("--calibration", required=True, help="YAML отложенной калибровочной выборки (split val)")
+    parser.add_argument("--weights", default=MODEL_PATH, help="путь к best.pt")
+    parser.add_argument("--backend", nargs="+", default=["onnx", "openvino"], choices=["onnx", "openvino"])
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--threads", type=int, default=0, help="потоков torch (0 – по умолчанию)")
+    parser.add_argument("--latency-frames", type=int, default=200)
+    parser.add_argument("--output", help="файл для JSON-отчёта")
+    args = parser.parse_args()
+
+    if args.threads > 0:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    images = val_images(args.data, args.latency_frames)
+    variants = [("torch", "fp32")] + [(backend, precision) for backend in args.backend
+                                      for precision in ("fp32", "int8")]
+    results = []
+    for backend, precision in variants:
+        engine = create_engine(backend, weights_path=args.weights, imgsz=args.imgsz,
+                               precision=precision, calibration_data=args.calibration)
+        engine.prepare()
+        engine.load()
+        engine.warmup()
+        result = {"backend": backend, "precision": precision, "artifact": engine.artifact_path()}
+        result.update(evaluate(engine, args.data, images))
+        results.append(result)
+
+    header = f"{'variant':16} {'mAP50':>7} {'mAP50-95':>9} " + " ".join(
+        f"{name:>9}" for name in class_names.values()) + f" {'p50 ms':>8} {'p99 ms':>8}"
+    print(header)
+    for result in results:
+        print(
+            f"{result['backend'] + '/' + result['precision']:16} {result['map50']:>7} {result['map50_95']:>9} "
+            + " ".join(f"{str(result['per_class'][name]['map50_95']):>9}" for name in class_names.values())
+            + f" {result['latency_ms']['p50']:>8} {result['latency_ms']['p99']:>8}"
+        )
+
+    if args.output:
+        report = {"weights": os.path.abspath(args.weights), "data": args.data,
+                  "calibration": args.calibration, "imgsz": args.imgsz, "results": results}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Отчёт сохранён в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,199 @@
+"""
+Конвейерный прогон видео через продакшн-движок инференса (без окна, headless).
+
+Захват, инференс и запись идут параллельно:
+    поток захвата -> ограниченная очередь кадров -> батчевый инференс -> очередь -> поток записи.
+Если инференс не успевает за источником, захват выбрасывает самый старый кадр из очереди
+(--no-drop – обработать каждый кадр, захват тогда ждёт). В конце – достигнутый FPS и
+число выброшенных кадров. Удобно для прогона записанных сессий через новые веса.
+
+Пример:
+    python model/test_model/video_ml.py --source session.mp4 --output annotated.mp4 \
+        --detections session.ndjson --backend openvino --batch-size 4
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
 import cv2
-from ultralytics import YOLO
-
-# Загрузите вашу обученную модель (путь к файлу .pt)
-model = YOLO(r"C:\develop\zazeks\backend\src\api\best.pt")
-
-# Определите сопоставление номеров классов с их названиями
-class_names = {0: "Paper", 1: "Rock", 2: "Scissors"}
-
-# Открытие видеопотока (0 – вебкамера, либо можно указать путь к видеофайлу)
-cap = cv2.VideoCapture(0)
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        print("Не удалось получить кадр с камеры")
-        break
-
-    # Выполнение детекции на текущем кадре
-    # Если требуется задать порог уверенности, можно использовать параметр conf
-    results = model(frame, conf=0.4)
-
-    # Обработка результатов
-    # Результаты – это список объектов, по одному для каждого изображения
-    for result in results:
-        # Доступ к найденным bounding boxes
-        boxes = result.boxes
-        for box in boxes:
-            # Получение координат ограничивающего прямоугольника
-            # box.xyxy содержит координаты в формате [x1, y1, x2, y2]
-            x1, y1, x2, y2 = box.xyxy[0]
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-
-            # Получение значения уверенности (confidence) и номера класса (cls)
-            conf = box.conf[0] if hasattr(box, 'conf') else 0
-            cls = int(box.cls[0]) if hasattr(box, 'cls') else -1
-
-            # Получение метки класса
-            label = class_names.get(cls, "неизвестно")
-
-            # Рисуем прямоугольник и текст с меткой и уверенностью
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(frame, f"{label}: {conf:.2f}", (x1, y1 - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-
-    # Отображаем кадр с детекциями
-    cv2.imshow("Детекция объектов", frame)
-
-    # Выход по нажатию клавиши 'q'
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-# Освобождение видеопотока и закрытие окон
-cap.release()
-cv2.destroyAllWindows()
+
+from benchmark import REPO_ROOT, percentile
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "backend"))
+
+_END = None  # признак конца потока кадров в очередях
+
+
+class FrameCapture(threading.Thread):
+    """Читает кадры источника в ограниченную очередь; при переполнении выбрасывает самый старый."""
+
+    def __init__(self, capture, frames: queue.Queue, drop: bool):
+        super().__init__(daemon=True)
+        self.capture = capture
+        self.frames = frames
+        self.drop = drop
+        self.read = 0
+        self.dropped = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            ok, frame = self.capture.read()
+            if not ok:
+                break
+            item = (self.read, frame)
+            self.read += 1
+            if not self.drop:
+                self.frames.put(item)
+                continue
+            while True:
+                try:
+                    self.frames.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self.frames.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        self.frames.put(_END)
+
+
+class ResultWriter(threading.Thread):
+    """Рисует детекции и пишет видео и/или NDJSON с результатами по кадрам."""
+
+    def __init__(self, results: queue.Queue, video_writer=None, detections_file=None):
+        super().__init__(daemon=True)
+        self.results = results
+        self.video_writer = video_writer
+        self.detections_file = detections_file
+
+    def run(self):
+        while True:
+            item = self.results.get()
+            if item is _END:
+                break
+            index, frame, detection = item
+            if self.detections_file is not None:
+                self.detections_file.write(json.dumps(dict(detection, frame=index)) + "\n")
+            if self.video_writer is not None:
+                if detection["bbox"]:
+                    x1, y1, x2, y2 = (int(value) for value in detection["bbox"])
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                    cv2.putText(frame, f"{detection['gesture']}: {detection['confidence']:.2f}", (x1, y1 - 10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+                self.video_writer.write(frame)
+
+
+def next_batch(frames: queue.Queue, batch_size: int):
+    """Ждёт первый кадр и добирает в батч то, что уже лежит в очереди; None – источник закончился."""
+    first = frames.get()
+    if first is _END:
+        return None
+    batch = [first]
+    while len(batch) < batch_size:
+        try:
+            item = frames.get_nowait()
+        except queue.Empty:
+            break
+        if item is _END:
+            frames.put(_END)  # вернуть признак конца для следующего вызова
+            break
+        batch.append(item)
+    return batch
+
+
+def main():
+    from src.inference.engines import create_engine
+    from src.inference.model import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Конвейерный прогон видео через детектор жестов")
+    parser.add_argument("--source", default="0", help="видеофайл или номер камеры")
+    parser.add_argument("--weights", default=MODEL_PATH, help="путь к best.pt")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "openvino"])
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "int8"])
+    parser.add_argument("--calibration", help="YAML калибровочной выборки для int8")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=8, help="кадров в очереди между захватом и инференсом")
+    parser.add_argument("--no-drop", action="store_true", help="не выбрасывать кадры, даже если инференс отстаёт")
+    parser.add_argument("--output", help="куда записать видео с разметкой")
+    parser.add_argument("--detections", help="куда записать NDJSON с детекциями по кадрам")
+    parser.add_argument("--max-frames", type=int, default=0, help="остановиться после стольких кадров (0 – до конца)")
+    args = parser.parse_args()
+
+    engine = create_engine(args.backend, weights_path=args.weights, imgsz=args.imgsz,
+                           precision=args.precision, calibration_data=args.calibration)
+    engine.prepare()
+    engine.load()
+    engine.warmup()
+
+    capture = cv2.VideoCapture(int(args.source) if args.source.isdigit() else args.source)
+    if not capture.isOpened():
+        parser.error(f"не удалось открыть источник {args.source}")
+    source_fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    video_writer = None
+    if args.output:
+        video_writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*"mp4v"), source_fps, (width, height))
+    detections_file = open(args.detections, "w") if args.detections else None
+
+    frames = queue.Queue(maxsize=max(1, args.queue_size))
+    results = queue.Queue(maxsize=max(1, args.queue_size) * 4)
+    reader = FrameCapture(capture, frames, drop=not args.no_drop)
+    writer = ResultWriter(results, video_writer, detections_file)
+
+    batch_times = []
+    processed = 0
+    started = time.perf_counter()
+    reader.start()
+    writer.start()
+    try:
+        while True:
+            batch = next_batch(frames, args.batch_size)
+            if batch is None:
+                break
+            batch_started = time.perf_counter()
+            outputs = engine.predict([frame for _, frame in batch])
+            batch_times.append(time.perf_counter() - batch_started)
+            for (index, frame), detection in zip(batch, outputs):
+                results.put((index, frame, detection))
+            processed += len(batch)
+            if args.max_frames and processed >= args.max_frames:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.stopped.set()
+        results.put(_END)
+        writer.join()
+        elapsed = time.perf_counter() - started
+        # VideoCapture не потокобезопасен: освобождаем его, только когда читатель вышел из read().
+        # Читатель может ждать места в очереди (--no-drop или итоговый _END) – разгружаем её
+        while reader.is_alive():
+            try:
+                frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        reader.join()
+        capture.release()
+        if video_writer is not None:
+            video_writer.release()
+        if detections_file is not None:
+            detections_file.close()
+
+    print(f"Прочитано кадров: {reader.read}, обработано: {processed}, выброшено: {reader.dropped}")
+    print(f"Достигнутый FPS: {processed / elapsed:.1f} (источник {source_fps:.1f}), время: {elapsed:.1f} с")
+    if batch_times:
+        print(f"Батч (до {args.batch_size} кадров): p50 {percentile(batch_times, 50) * 1000:.1f} мс, "
+              f"p99 {percentile(batch_times, 99) * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()